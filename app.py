@@ -1,14 +1,19 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import os
 from dotenv import load_dotenv
 from datetime import datetime
+import time
 import uuid
+import hashlib
+import html
 from PIL import Image
 import io
+from concurrent.futures import ThreadPoolExecutor
 
 from gemini_client import GeminiPhotoshootClient
-from prompt_builder import build_photoshoot_prompt, map_platform_preset_to_aspect_ratio
-from image_utils import S3ImageHandler
+from prompt_builder import build_photoshoot_prompt_sections, map_platform_preset_to_aspect_ratio
+from image_utils import S3ImageHandler, make_thumbnail
 
 load_dotenv()
 
@@ -21,196 +26,9 @@ st.set_page_config(
 )
 
 # Custom CSS for professional tabbed styling
-st.markdown("""
-<style>
-    /* Main container styling - minimal padding */
-    .main .block-container {
-        padding-top: 0rem !important;
-        padding-bottom: 0rem !important;
-        max-width: 100%;
-    }
-    
-    /* Remove footer but keep header and menu for deploy button */
-    footer {visibility: hidden; height: 0 !important; margin: 0 !important; padding: 0 !important;}
-    
-    /* Remove Streamlit default top padding */
-    .main {
-        padding-top: 0rem !important;
-    }
-    
-    /* Remove spacing from app viewport */
-    .appview-container {
-        padding-top: 0rem !important;
-        padding-bottom: 0rem !important;
-    }
-    
-    /* Tab container - justify tabs evenly */
-    .stTabs [data-baseweb="tab-list"] {
-        display: flex;
-        justify-content: space-between;
-        gap: 4px;
-        background-color: #1e1e1e;
-        padding: 6px;
-        border-radius: 8px;
-        margin-top: 0.25rem;
-        margin-bottom: 0.5rem;
-        width: 100%;
-    }
-    
-    /* Individual tabs - flex to fill space evenly */
-    .stTabs [data-baseweb="tab-list"] button {
-        flex: 1;
-        min-width: 0;
-        height: 48px;
-        padding: 10px 12px;
-        background-color: white;
-        border-radius: 6px;
-        font-weight: 500;
-        color: #666;
-        border: 1px solid #e0e0e0;
-        transition: all 0.3s ease;
-        white-space: nowrap;
-        overflow: hidden;
-        text-overflow: ellipsis;
-    }
-    
-    .stTabs [data-baseweb="tab"]:hover {
-        background-color: #f8f9fa;
-        color: #333;
-    }
-    
-    .stTabs [data-baseweb="tab-list"] button[aria-selected="true"] {
-        background-color: #ff4b4b;
-        color: white;
-        border-color: #ff4b4b;
-        font-weight: 600;
-    }
-    
-    /* Status badges in tabs */
-    .tab-badge {
-        display: inline-block;
-        margin-left: 6px;
-        padding: 2px 6px;
-        border-radius: 10px;
-        font-size: 0.7rem;
-        font-weight: 600;
-    }
-    
-    .badge-required {
-        color: #ff4b4b;
-    }
-    
-    .badge-done {
-        background-color: #00d26a;
-        color: white;
-    }
-    
-    /* Image preview container */
-    .image-preview {
-        border: 2px dashed #0f3460;
-        border-radius: 8px;
-        padding: 1rem;
-        text-align: center;
-        min-height: 150px;
-    }
-    
-    /* Section header */
-    .section-header {
-        font-size: 1.5rem;
-        font-weight: 600;
-        margin-bottom: 1rem;
-        color: #e94560;
-    }
-    
-    /* Sticky footer for JSON preview and generate button */
-    div[data-testid="stVerticalBlock"]:has(button[key="generate_button"]) {
-        position: sticky;
-        bottom: 0;
-        background: white;
-        padding: 1rem;
-        border-top: 2px solid #e0e0e0;
-        box-shadow: 0 -2px 10px rgba(0,0,0,0.1);
-        z-index: 100;
-        margin-top: 2rem;
-    }
-    
-    /* Dark mode for sticky footer */
-    [data-theme="dark"] div[data-testid="stVerticalBlock"]:has(button[key="generate_button"]),
-    .stApp[data-theme="dark"] div[data-testid="stVerticalBlock"]:has(button[key="generate_button"]) {
-        background-color: #0e1117;
-        border-top-color: #333;
-    }
-    
-    /* Remove bottom spacing from last elements */
-    .main .block-container > div:last-child {
-        margin-bottom: 0rem !important;
-        padding-bottom: 0rem !important;
-    }
-    
-    /* Reduce spacing in Streamlit elements */
-    .element-container {
-        margin-bottom: 0.5rem;
-    }
-    
-    /* Reduce title spacing - minimal */
-    h1 {
-        margin-bottom: 0.25rem !important;
-        margin-top: 0.25rem !important;
-        padding-top: 0rem !important;
-        padding-bottom: 0rem !important;
-    }
-    
-    /* Reduce caption spacing */
-    .stCaption {
-        margin-bottom: 0.25rem !important;
-        margin-top: 0rem !important;
-    }
-    
-    /* Reduce spacing between title and tabs */
-    div[data-testid="stVerticalBlock"] > div:first-child {
-        margin-bottom: 0.25rem !important;
-        margin-top: 0rem !important;
-    }
-    
-    /* Remove extra spacing from Streamlit blocks */
-    section[data-testid="stAppViewContainer"] {
-        padding-top: 0rem !important;
-        padding-bottom: 0rem !important;
-    }
-    
-    /* Reduce spacing in all vertical blocks */
-    div[data-testid="stVerticalBlock"] {
-        gap: 0.25rem;
-    }
-    
-    /* Disable typing in selectboxes - make them selection-only */
-    div[data-baseweb="select"] input,
-    div[data-baseweb="select"] input[type="text"],
-    .stSelectbox input,
-    .stSelectbox input[type="text"] {
-        pointer-events: none;
-        cursor: pointer;
-        user-select: none;
-        -webkit-user-select: none;
-        -moz-user-select: none;
-        -ms-user-select: none;
-    }
-    
-    /* Ensure selectbox container is clickable but input is not */
-    div[data-baseweb="select"] {
-        cursor: pointer;
-    }
-    
-    div[data-baseweb="select"] input:focus {
-        outline: none;
-    }
-    
-    /* Prevent text input in selectbox */
-    div[data-baseweb="select"] input[readonly] {
-        background-color: transparent;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Served from static/styles.css (see .streamlit/config.toml) so the browser caches
+# it and each rerun only sends the link tag instead of the full stylesheet
+st.markdown('<link rel="stylesheet" href="app/static/styles.css">', unsafe_allow_html=True)
 
 # Initialize clients
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -218,8 +36,27 @@ if not GEMINI_API_KEY:
     st.error("GEMINI_API_KEY not found in .env file!")
     st.stop()
 
-client = GeminiPhotoshootClient(GEMINI_API_KEY)
-s3_handler = S3ImageHandler()
+# Cached so the clients and their connection pools survive across reruns
+@st.cache_resource
+def _get_client(api_key, file_uri_prefixes=()):
+    return GeminiPhotoshootClient(api_key, file_uri_prefixes)
+
+@st.cache_resource
+def _get_s3():
+    return S3ImageHandler()
+
+s3_handler = _get_s3()
+
+# Pillow releases the GIL while decoding and resizing, so a shared thread pool
+# downscales in parallel without forking the multi-threaded server process
+@st.cache_resource
+def _get_thumbnail_pool():
+    return ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+
+# Set GEMINI_USE_FILE_URI=1 to let Gemini fetch our uploaded references by URL
+# instead of downloading and inlining them as base64
+_file_uri_prefixes = (s3_handler.get_public_url(""),) if os.getenv("GEMINI_USE_FILE_URI") == "1" else ()
+client = _get_client(GEMINI_API_KEY, _file_uri_prefixes)
 
 # Initialize session state for configuration
 if 'additional_items' not in st.session_state:
@@ -231,6 +68,15 @@ if 'quick_fix_mode' not in st.session_state:
 if 'quick_fix_images' not in st.session_state:
     st.session_state.quick_fix_images = []
 
+@st.cache_data(show_spinner=False)
+def _upload_reference_cached(digest, image_type, _file_obj, _filename):
+    """Upload a reference image once per content hash (failed uploads are not cached)"""
+    _file_obj.seek(0)
+    result = s3_handler.upload_reference_image(_file_obj, _filename, image_type)
+    if not result['success']:
+        raise RuntimeError(result.get('error'))
+    return result['public_url']
+
 # Helper function for image upload with S3
 def handle_image_upload(file_obj, image_type, session_key):
     """Handle image upload to S3 and store URL in session state"""
@@ -241,25 +87,80 @@ def handle_image_upload(file_obj, image_type, session_key):
         with col2:
             if st.button(f"Upload", key=f"upload_{session_key}"):
                 with st.spinner("Uploading..."):
-                    image_bytes = file_obj.read()
-                    result = s3_handler.upload_reference_image(
-                        image_bytes,
-                        file_obj.name,
-                        image_type
-                    )
-                    if result['success']:
-                        st.session_state[f"{session_key}_url"] = result['public_url']
+                    # Skip the S3 PUT when these exact bytes were already uploaded.
+                    # getvalue() exposes the spooled buffer for hashing; the upload
+                    # itself streams from file_obj.
+                    digest = hashlib.blake2b(file_obj.getvalue(), digest_size=16).hexdigest()
+                    s3_cache = st.session_state.setdefault('_s3_cache', {})
+                    try:
+                        if digest not in s3_cache:
+                            s3_cache[digest] = _upload_reference_cached(
+                                digest,
+                                image_type,
+                                file_obj,
+                                file_obj.name
+                            )
+                    except Exception as e:
+                        st.error(f"Upload failed: {str(e)}")
+                    else:
+                        st.session_state[f"{session_key}_url"] = s3_cache[digest]
                         st.success("Uploaded successfully")
                         st.rerun()
-                    else:
-                        st.error(f"Upload failed: {result.get('error')}")
         
         # Show uploaded URL if exists
         if st.session_state.get(f"{session_key}_url"):
             st.caption(f"Uploaded: {st.session_state[f'{session_key}_url'][:50]}...")
 
+# Browser-side uploader that POSTs files directly to S3 (see components/s3_direct_upload)
+_s3_direct_upload = components.declare_component(
+    "s3_direct_upload",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "s3_direct_upload")
+)
+
+def handle_direct_upload(label, image_type, session_key):
+    """Upload an image from the browser to S3 with a presigned POST and store its URL in session state"""
+    # One presigned POST per image type, shared by the sections using it, until
+    # it is used or about to expire
+    presign_key = f"_presign_{image_type}"
+    presigned = st.session_state.get(presign_key)
+    if not presigned or presigned.get('expires_at', 0) - 30 < time.time():
+        presigned = s3_handler.create_presigned_post(image_type)
+        st.session_state[presign_key] = presigned
+    
+    # URLs of this session's direct uploads by "name:size"; the component reuses
+    # a match instead of uploading the same file again
+    direct_uploads = st.session_state.setdefault('_direct_uploads', {})
+    
+    uploaded = _s3_direct_upload(
+        label=label,
+        presigned=presigned,
+        known=direct_uploads,
+        key=f"{session_key}_direct",
+        default=None
+    )
+    # The component keeps returning its last value, so handle each one once
+    seen_key = f"_{session_key}_direct_seen"
+    if uploaded and uploaded['url'] != st.session_state.get(seen_key):
+        st.session_state[seen_key] = uploaded['url']
+        file_key = f"{uploaded['name']}:{uploaded['size']}"
+        if file_key not in direct_uploads:
+            direct_uploads[file_key] = uploaded['url']
+            st.session_state.pop(presign_key, None)  # spent on this upload
+        st.session_state[f"{session_key}_url"] = direct_uploads[file_key]
+        st.rerun()
+    
+    # Show uploaded URL if exists
+    if st.session_state.get(f"{session_key}_url"):
+        st.caption(f"Uploaded: {st.session_state[f'{session_key}_url'][:50]}...")
+
+@st.fragment
 def render_input_section(section_key, label, show_preservation=False):
-    """Render input section with text description and image upload options"""
+    """
+    Render input section with text description and image upload options.
+    
+    Runs as a fragment so edits only rerun this section. The section values are
+    written to st.session_state[f"{section_key}_cfg"] for build_config to read.
+    """
     
     # Text description - always shown
     text_value = st.text_area(
@@ -269,14 +170,8 @@ def render_input_section(section_key, label, show_preservation=False):
         placeholder=f"Describe the {label.lower()} in detail..."
     )
     
-    # Image upload - always shown
-    uploaded_file = st.file_uploader(
-        f"Upload {label} Image (Optional)",
-        type=['jpg', 'jpeg', 'png'],
-        key=f"{section_key}_file"
-    )
-    if uploaded_file:
-        handle_image_upload(uploaded_file, section_key, section_key)
+    # Image upload - always shown, sent from the browser straight to S3
+    handle_direct_upload(f"Upload {label} Image (Optional)", section_key, section_key)
     
     if show_preservation:
         st.divider()
@@ -285,31 +180,46 @@ def render_input_section(section_key, label, show_preservation=False):
             ["Strict - Exact match", "Relaxed - Allow lighting variations"],
             key=f"{section_key}_preservation"
         )
-        return {
+        st.session_state[f"{section_key}_cfg"] = {
             "text": text_value,
             "image_url": st.session_state.get(f"{section_key}_url", ""),
             "preservation": "strict" if "Strict" in preservation else "relaxed"
         }
+    else:
+        st.session_state[f"{section_key}_cfg"] = {
+            "text": text_value,
+            "image_url": st.session_state.get(f"{section_key}_url", "")
+        }
     
-    return {
-        "text": text_value,
-        "image_url": st.session_state.get(f"{section_key}_url", "")
-    }
+    _sync_tab_labels()
+
+# Photoshoot tabs as (name, section_key, is_required)
+_TABS = (
+    ("Model", "model_ref", True),
+    ("Outfit", "outfit", True),
+    ("Accessories & Jewelry", "accessories", False),
+    ("Environment & Photography", "environment", True),
+    ("Output", "output", True)
+)
 
-def get_section_status(section_key):
-    """Check if a section has been configured"""
-    has_text = bool(st.session_state.get(f"{section_key}_text", ""))
-    has_url = bool(st.session_state.get(f"{section_key}_url", ""))
-    return has_text or has_url
+def get_tab_labels():
+    """Get all tab labels with status indicators (configured ✓, required *)"""
+    state = st.session_state
+    return [
+        f"{name} ✓" if (state.get(f"{key}_text") or state.get(f"{key}_url"))
+        else (f"{name} *" if is_required else name)
+        for name, key, is_required in _TABS
+    ]
 
-def get_tab_label(name, section_key, is_required=False):
-    """Get tab label with status indicator"""
-    status = get_section_status(section_key)
-    if status:
-        return f"{name} ✓"
-    elif is_required:
-        return f"{name} *"
-    return name
+def _sync_tab_labels():
+    """
+    Rerun the whole app when a fragment's edits change the tab labels.
+    
+    The tabs are drawn outside the fragments, so a fragment-only rerun would
+    otherwise leave the ✓ / * marks showing the previous completion state.
+    """
+    if get_tab_labels() != st.session_state.get("_tab_labels"):
+        st.rerun(scope="app")
 
 def determine_method(text, image_url, default="auto"):
     """Auto-determine method based on what fields are filled"""
@@ -325,140 +235,530 @@ def determine_method(text, image_url, default="auto"):
     else:
         return default
 
-def build_config():
-    """Build the configuration dictionary from all inputs"""
-    
-    # Platform preset mapping
-    platform_map = {
-        "Instagram Portrait (4:5)": "instagram_portrait",
-        "Instagram Story (9:16)": "instagram_story",
-        "Instagram Square (1:1)": "instagram_square",
-        "Default (2:3)": "default"
-    }
-    
-    # Framing mapping
-    framing_map = {
-        "Full Body": "full_body",
-        "3/4 Body": "3/4_body",
-        "Waist Up": "waist_up",
-        "Close Up": "close_up"
-    }
-    
-    # Lighting mapping
-    lighting_map = {
-        "Soft Warm": "soft_warm",
-        "Studio Clean": "studio_clean",
-        "Golden Hour": "golden_hour",
-        "Hard Shadows": "hard_shadows",
-        "Natural": "natural"
-    }
+# Session state keys read by build_config, with the default used when a key is unset
+_CFG_KEYS = (
+    ("platform_preset", "Instagram Portrait (4:5)"),
+    ("model_ref_cfg", {}),
+    ("model_action", None),
+    ("model_new_description", ""),
+    ("outfit_cfg", {}),
+    ("additional_items", []),
+    ("jewelry_neck_text", ""),
+    ("jewelry_neck_url", ""),
+    ("jewelry_ears_text", ""),
+    ("jewelry_ears_url", ""),
+    ("jewelry_hands_text", ""),
+    ("jewelry_hands_url", ""),
+    ("env_category", "Studio"),
+    ("environment_text", ""),
+    ("environment_url", ""),
+    ("photo_aesthetic", "Commercial"),
+    ("photo_framing", "3/4 Body"),
+    ("photo_lighting", "Soft Warm"),
+    ("shadow_method", None),
+    ("shadow_option", None),
+    ("shadow_text", ""),
+    ("pose_text", ""),
+    ("pose_url", ""),
+    ("pose_strength", 0.8),
+    ("hair_text", ""),
+    ("hair_url", ""),
+    ("image_count", 2),
+    ("batch_variety", "Subtle Variations"),
+    ("image_quality", "4K"),
+)
+
+# Normalized config values for the closed environment/aesthetic selectbox options
+_ENV_NORM = {
+    "Studio": "studio",
+    "Indoor Lifestyle": "indoor_lifestyle",
+    "Outdoor Urban": "outdoor_urban",
+    "Outdoor Nature": "outdoor_nature"
+}
+_AES_NORM = {s: s.lower() for s in ["Editorial", "Commercial", "Lifestyle", "High Fashion", "Casual"]}
+
+# Platform preset mapping
+_PLATFORM_MAP = {
+    "Instagram Portrait (4:5)": "instagram_portrait",
+    "Instagram Story (9:16)": "instagram_story",
+    "Instagram Square (1:1)": "instagram_square",
+    "Default (2:3)": "default"
+}
+
+# Framing mapping
+_FRAMING_MAP = {
+    "Full Body": "full_body",
+    "3/4 Body": "3/4_body",
+    "Waist Up": "waist_up",
+    "Close Up": "close_up"
+}
+
+# Lighting mapping
+_LIGHTING_MAP = {
+    "Soft Warm": "soft_warm",
+    "Studio Clean": "studio_clean",
+    "Golden Hour": "golden_hour",
+    "Hard Shadows": "hard_shadows",
+    "Natural": "natural"
+}
+
+# Jewelry config locations and their session state key suffixes
+_JEWELRY_LOCATIONS = (("neck", "neck"), ("ears", "ears"), ("hands_wrists", "hands"))
+
+# Bounded: every widget edit in every session produces a new fingerprint
+@st.cache_data(show_spinner=False, max_entries=64)
+def _build_config_cached(fingerprint):
+    """Assemble the configuration dictionary from a session state fingerprint"""
+    state = dict(zip((key for key, _ in _CFG_KEYS), fingerprint))
+    model_ref_text = state["model_ref_cfg"].get("text", "")
+    model_ref_url = state["model_ref_cfg"].get("image_url", "")
+    outfit_text = state["outfit_cfg"].get("text", "")
+    outfit_url = state["outfit_cfg"].get("image_url", "")
     
     config = {
         "meta": {
-            "job_id": f"job_{uuid.uuid4().hex[:8]}",
+            "job_id": None,  # Filled in per call by build_config
             "client_id": "photoshoot_app",
-            "platform_preset": platform_map.get(
-                st.session_state.get("platform_preset", "Instagram Portrait (4:5)"),
-                "instagram_portrait"
-            )
+            "platform_preset": _PLATFORM_MAP.get(state["platform_preset"], "instagram_portrait")
         },
         "model_reference": {
             "method": determine_method(
-                st.session_state.get("model_ref_text", ""),
-                st.session_state.get("model_ref_url", ""),
+                model_ref_text,
+                model_ref_url,
                 "text_description"
             ),
-            "text_description": st.session_state.get("model_ref_text", ""),
-            "image_url": st.session_state.get("model_ref_url", ""),
-            "face_action": "keep" if st.session_state.get("model_action") == "Keep from reference" else "generate",
-            "new_model_description": st.session_state.get("model_new_description", "")
+            "text_description": model_ref_text,
+            "image_url": model_ref_url,
+            "face_action": "keep" if state["model_action"] == "Keep from reference" else "generate",
+            "new_model_description": state["model_new_description"]
         },
         "base_outfit": {
             "method": determine_method(
-                st.session_state.get("outfit_text", ""),
-                st.session_state.get("outfit_url", ""),
+                outfit_text,
+                outfit_url,
                 "text_description"
             ),
-            "text_description": st.session_state.get("outfit_text", ""),
-            "image_url": st.session_state.get("outfit_url", "")
+            "text_description": outfit_text,
+            "image_url": outfit_url
             },
-        "additional_items": st.session_state.get("additional_items", []),
+        "additional_items": state["additional_items"],
         "jewelry": {
-            "neck": {
-                "enabled": bool(st.session_state.get("jewelry_neck_text", "") or st.session_state.get("jewelry_neck_url", "")),
-                "method": determine_method(
-                    st.session_state.get("jewelry_neck_text", ""),
-                    st.session_state.get("jewelry_neck_url", ""),
-                    "none"
-                ),
-                "text": st.session_state.get("jewelry_neck_text", ""),
-                "image_url": st.session_state.get("jewelry_neck_url", "")
-            },
-            "ears": {
-                "enabled": bool(st.session_state.get("jewelry_ears_text", "") or st.session_state.get("jewelry_ears_url", "")),
-                "method": determine_method(
-                    st.session_state.get("jewelry_ears_text", ""),
-                    st.session_state.get("jewelry_ears_url", ""),
-                    "none"
-                ),
-                "text": st.session_state.get("jewelry_ears_text", ""),
-                "image_url": st.session_state.get("jewelry_ears_url", "")
-            },
-            "hands_wrists": {
-                "enabled": bool(st.session_state.get("jewelry_hands_text", "") or st.session_state.get("jewelry_hands_url", "")),
-                "method": determine_method(
-                    st.session_state.get("jewelry_hands_text", ""),
-                    st.session_state.get("jewelry_hands_url", ""),
-                    "none"
-                ),
-                "text": st.session_state.get("jewelry_hands_text", ""),
-                "image_url": st.session_state.get("jewelry_hands_url", "")
+            location: {
+                "enabled": bool(text or image_url),
+                "method": determine_method(text, image_url, "none"),
+                "text": text,
+                "image_url": image_url
             }
+            for location, text, image_url in (
+                (location, state[f"jewelry_{key}_text"], state[f"jewelry_{key}_url"])
+                for location, key in _JEWELRY_LOCATIONS
+            )
         },
         "environment": {
-            "category": st.session_state.get("env_category", "Studio").lower().replace(" ", "_"),
+            "category": _ENV_NORM[state["env_category"]],
             "method": determine_method(
-                st.session_state.get("environment_text", ""),
-                st.session_state.get("environment_url", ""),
+                state["environment_text"],
+                state["environment_url"],
                 "auto"
             ),
-            "text_description": st.session_state.get("environment_text", ""),
-            "image_url": st.session_state.get("environment_url", "")
+            "text_description": state["environment_text"],
+            "image_url": state["environment_url"]
         },
         "photography": {
-            "aesthetic": st.session_state.get("photo_aesthetic", "Commercial").lower(),
-            "framing": framing_map.get(st.session_state.get("photo_framing", "3/4 Body"), "3/4_body"),
-            "lighting": lighting_map.get(st.session_state.get("photo_lighting", "Soft Warm"), "soft_warm"),
-            "shadows": st.session_state.get("shadow_option") if st.session_state.get("shadow_method") == "Select from options" else st.session_state.get("shadow_text", ""),
+            "aesthetic": _AES_NORM[state["photo_aesthetic"]],
+            "framing": _FRAMING_MAP.get(state["photo_framing"], "3/4_body"),
+            "lighting": _LIGHTING_MAP.get(state["photo_lighting"], "soft_warm"),
+            "shadows": state["shadow_option"] if state["shadow_method"] == "Select from options" else state["shadow_text"],
             "pose": {
                 "method": determine_method(
-                    st.session_state.get("pose_text", ""),
-                    st.session_state.get("pose_url", ""),
+                    state["pose_text"],
+                    state["pose_url"],
                     "auto"
                 ),
-                "text": st.session_state.get("pose_text", ""),
-                "image_url": st.session_state.get("pose_url", ""),
-                "strength": st.session_state.get("pose_strength", 0.8)
+                "text": state["pose_text"],
+                "image_url": state["pose_url"],
+                "strength": state["pose_strength"]
         },
             "hair": {
                 "method": determine_method(
-                    st.session_state.get("hair_text", ""),
-                    st.session_state.get("hair_url", ""),
+                    state["hair_text"],
+                    state["hair_url"],
                     "auto"
                 ),
-                "text": st.session_state.get("hair_text", ""),
-                "image_url": st.session_state.get("hair_url", "")
+                "text": state["hair_text"],
+                "image_url": state["hair_url"]
             }
         },
         "output": {
-            "count": st.session_state.get("image_count", 2),
-            "batch_variety": "subtle_variations" if "Subtle" in st.session_state.get("batch_variety", "Subtle Variations") else "dynamic_angles",
-            "image_quality": st.session_state.get("image_quality", "4K")
+            "count": state["image_count"],
+            "batch_variety": "subtle_variations" if "Subtle" in state["batch_variety"] else "dynamic_angles",
+            "image_quality": state["image_quality"]
         }
     }
     
     return config
 
+def build_config():
+    """Build the configuration dictionary from all inputs"""
+    fingerprint = tuple(st.session_state.get(key, default) for key, default in _CFG_KEYS)
+    
+    # st.cache_data hands back a fresh copy, so the job ID can be set per call
+    config = _build_config_cached(fingerprint)
+    config["meta"]["job_id"] = f"job_{uuid.uuid4().hex[:8]}"
+    return config
+
+def render_config_preview():
+    """
+    Render the JSON configuration preview.
+    
+    Not a fragment: it has no widgets of its own, so it must redraw on every full
+    rerun to pick up edits made in the tab fragments.
+    """
+    st.json(build_config())
+
+# Model Reference Tab
+@st.fragment
+def _render_model_tab():
+    """Render the Model Reference tab"""
+    st.markdown("### Model Reference")
+    st.caption("Define the model's appearance - face, body type, and characteristics")
+    
+    with st.container():
+        render_input_section("model_ref", "Model")
+        
+        # Additional model options
+        st.divider()
+        col1, col2 = st.columns(2)
+        with col1:
+            model_action = st.radio(
+                "Model Face",
+                ["Keep from reference", "Generate new"],
+                key="model_action",
+                horizontal=True
+            )
+        
+        if model_action == "Generate new":
+            st.text_area(
+                "Model Description",
+                key="model_new_description",
+                height=100,
+                placeholder="Describe the model's appearance (e.g., ethnicity, hair color, age, facial features, etc.)"
+            )
+        
+        # Hair styling (moved from Photography tab)
+        st.divider()
+        st.markdown("##### Hair Styling")
+        st.text_input(
+            "Hair Description (Optional)",
+            key="hair_text",
+            placeholder="e.g., Sleek bun, loose waves"
+        )
+        
+        hair_file = st.file_uploader(
+            "Upload Hair Reference (Optional)",
+            type=['jpg', 'jpeg', 'png'],
+            key="hair_file"
+        )
+        if hair_file:
+            handle_image_upload(hair_file, "hair", "hair")
+    
+    _sync_tab_labels()
+
+# Outfit Tab
+@st.fragment
+def _render_outfit_tab():
+    """Render the Base Outfit tab"""
+    st.markdown("### Base Outfit")
+    st.caption("Define the main clothing items for the photoshoot")
+    
+    with st.container():
+        render_input_section("outfit", "Outfit", show_preservation=False)
+    
+    _sync_tab_labels()
+
+# Accessories & Jewelry Tab (Combined)
+@st.fragment
+def _render_accessories_tab():
+    """Render the Accessories & Jewelry tab"""
+    st.markdown("### Accessories & Jewelry")
+    st.caption("Add accessories and configure jewelry for each body location")
+    
+    # Additional Items Section
+    st.markdown("##### Additional Items")
+    st.caption("Add optional accessories like bags, hats, scarves, sunglasses, etc.")
+    
+    with st.container():
+        # Display existing items
+        if st.session_state.additional_items:
+            st.markdown("**Added Items**")
+            for i, item in enumerate(st.session_state.additional_items):
+                col1, col2, col3 = st.columns([2, 2, 1])
+                with col1:
+                    st.text(f"{item['type']}")
+                with col2:
+                    st.caption(item.get('text', '')[:30] + "..." if item.get('text') else "Image reference")
+                with col3:
+                    if st.button("Remove", key=f"remove_item_{i}"):
+                        st.session_state.additional_items.pop(i)
+                        st.rerun()
+        
+        st.divider()
+        
+        # Add new item
+        st.markdown("**Add New Item**")
+        col1, col2 = st.columns([1, 2])
+        
+        with col1:
+            item_type = st.selectbox(
+                "Item Type",
+                ["Bag", "Hat", "Scarf", "Sunglasses", "Other"],
+                key="new_item_type"
+            )
+        
+        # Show all input options
+        new_item_text = st.text_area(
+            "Item Description (Optional)",
+            key="new_item_text",
+            height=80,
+            placeholder=f"Describe the {item_type.lower()}..."
+        )
+        
+        item_file = st.file_uploader(
+            "Upload Item Image (Optional)",
+            type=['jpg', 'jpeg', 'png'],
+            key="new_item_file"
+        )
+        if item_file:
+            handle_image_upload(item_file, "item", "new_item")
+        
+        new_item_url = st.session_state.get("new_item_url", "")
+        
+        if st.button("Add Item", type="secondary"):
+            new_item = {
+                "type": item_type.lower(),
+                "text": new_item_text,
+                "image_url": new_item_url
+            }
+            st.session_state.additional_items.append(new_item)
+            st.success(f"Added {item_type}")
+            st.rerun()
+        
+        st.divider()
+        
+        # Jewelry Section
+        st.markdown("##### Jewelry")
+        st.caption("Configure jewelry for each body location")
+        
+        jewelry_locations = [
+            ("Neck", "jewelry_neck", "Necklaces, chains, pendants"),
+            ("Ears", "jewelry_ears", "Earrings, ear cuffs"),
+            ("Hands/Wrists", "jewelry_hands", "Rings, bracelets, watches")
+        ]
+        
+        for location_name, location_key, description in jewelry_locations:
+            with st.expander(f"{location_name} - {description}", expanded=False):
+                # Show all input options - if user adds input, it will be used
+                st.text_input(
+                    f"{location_name} Description (Optional)",
+                    key=f"{location_key}_text",
+                    placeholder=f"e.g., Gold chain necklace with pendant"
+                )
+                
+                jewelry_file = st.file_uploader(
+                    f"Upload {location_name} Reference (Optional)",
+                    type=['jpg', 'jpeg', 'png'],
+                    key=f"{location_key}_file"
+                )
+                if jewelry_file:
+                    handle_image_upload(jewelry_file, location_key, location_key)
+    
+    _sync_tab_labels()
+
+# Environment & Photography Tab (Combined)
+@st.fragment
+def _render_environment_tab():
+    """Render the Environment & Photography tab"""
+    st.markdown("### Environment & Photography")
+    st.caption("Set the scene and configure visual style and camera settings")
+    
+    # Environment Section
+    st.markdown("##### Environment & Background")
+    
+    with st.container():
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.selectbox(
+                "Environment Category",
+                ["Studio", "Indoor Lifestyle", "Outdoor Urban", "Outdoor Nature"],
+                key="env_category"
+            )
+        
+        # Show all input options
+        st.text_area(
+            "Background Description (Optional)",
+            key="environment_text",
+            height=100,
+            placeholder="Describe the background/environment in detail...\ne.g., Abstract curved peach and warm beige walls with soft shadows"
+        )
+        
+        bg_file = st.file_uploader(
+            "Upload Background Reference (Optional)",
+            type=['jpg', 'jpeg', 'png'],
+            key="environment_file"
+        )
+        if bg_file:
+            handle_image_upload(bg_file, "background", "environment")
+        
+        st.divider()
+        
+        # Photography Section
+        st.markdown("##### Photography Settings")
+        
+        with st.container():
+            col1, col2, col3 = st.columns(3)
+            
+            with col1:
+                st.markdown("**Aesthetic**")
+                st.selectbox(
+                    "Style",
+                    ["Editorial", "Commercial", "Lifestyle", "High Fashion", "Casual"],
+                    key="photo_aesthetic",
+                    label_visibility="collapsed"
+                )
+            
+            with col2:
+                st.markdown("**Framing**")
+                st.selectbox(
+                    "Frame",
+                    ["Full Body", "3/4 Body", "Waist Up", "Close Up"],
+                    key="photo_framing",
+                    label_visibility="collapsed"
+                )
+            
+            with col3:
+                st.markdown("**Lighting**")
+                st.selectbox(
+                    "Light",
+                    ["Soft Warm", "Studio Clean", "Golden Hour", "Hard Shadows", "Natural"],
+                    key="photo_lighting",
+                    label_visibility="collapsed"
+                )
+            
+            st.divider()
+            
+            # Shadow settings
+            st.markdown("**Shadows**")
+            shadow_method = st.radio(
+                "Shadow Input Method",
+                ["Select from options", "Text description"],
+                key="shadow_method",
+                horizontal=True
+            )
+            
+            if shadow_method == "Select from options":
+                st.selectbox(
+                    "Shadow Style",
+                    [
+                        "None - No specific shadow requirements",
+                        "Blend model shadows with background shadows",
+                        "Natural soft shadows",
+                        "Dramatic hard shadows",
+                        "Minimal shadows for clean look",
+                        "Realistic ground shadows",
+                        "Subtle ambient shadows"
+                    ],
+                    key="shadow_option"
+                )
+            else:
+                st.text_area(
+                    "Shadow Description",
+                    key="shadow_text",
+                    height=80,
+                    placeholder="e.g., Soft natural shadows that blend seamlessly with the background lighting..."
+                )
+            
+            # Pose settings
+            st.markdown("**Pose**")
+            st.text_input(
+                "Pose Description (Optional)",
+                key="pose_text",
+                placeholder="e.g., Walking motion, hands in pockets"
+            )
+            
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                pose_file = st.file_uploader(
+                    "Upload Pose Reference (Optional)",
+                    type=['jpg', 'jpeg', 'png'],
+                    key="pose_file"
+                )
+                if pose_file:
+                    handle_image_upload(pose_file, "pose", "pose")
+            with col2:
+                st.slider("Mimicry Strength", 0.0, 1.0, 0.8, key="pose_strength")
+    
+    _sync_tab_labels()
+
+# Output Tab
+@st.fragment
+def _render_output_tab():
+    """Render the Output Settings tab"""
+    st.markdown("### Output Settings")
+    st.caption("Configure the final output parameters")
+    
+    with st.container():
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("##### Platform Preset")
+            st.selectbox(
+                "Platform",
+                ["Instagram Portrait (4:5)", "Instagram Story (9:16)", "Instagram Square (1:1)", "Default (2:3)"],
+                key="platform_preset",
+                label_visibility="collapsed"
+            )
+        
+        with col2:
+            st.markdown("##### Number of Images")
+            st.number_input(
+                "Count",
+                min_value=1,
+                max_value=10,
+                value=2,
+                key="image_count",
+                label_visibility="collapsed"
+            )
+        
+        st.divider()
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("##### Batch Variety")
+            st.radio(
+                "Variety",
+                ["Subtle Variations", "Dynamic Angles"],
+                key="batch_variety",
+                horizontal=True,
+                label_visibility="collapsed"
+            )
+        
+        with col2:
+            st.markdown("##### Image Quality")
+            st.selectbox(
+                "Quality",
+                ["1K", "2K", "4K"],
+                key="image_quality",
+                index=2,  # Default to 4K
+                label_visibility="collapsed",
+                help="Select image resolution: 1K (1024px), 2K (2048px), or 4K (4096px)"
+            )
+        
+        st.divider()
+    
+    _sync_tab_labels()
+
 # Main Header
 col_title, col_quick_fix = st.columns([3, 1])
 with col_title:
@@ -520,9 +820,10 @@ if st.session_state.quick_fix_mode:
             if len(st.session_state.quick_fix_images) < 14:
                 if st.button(f"Upload {file.name}", key=f"upload_qf_{file.name}"):
                     with st.spinner(f"Uploading {file.name}..."):
-                        image_bytes = file.read()
+                        # boto3 closes the file object it uploads, so give it a
+                        # copy and keep the UploadedFile readable for the preview
                         result = s3_handler.upload_reference_image(
-                            image_bytes,
+                            io.BytesIO(file.getvalue()),
                             file.name,
                             "quick_fix"
                         )
@@ -632,337 +933,29 @@ if st.session_state.quick_fix_mode:
 # Normal Photoshoot Mode - Create tabs
 else:
     # Create tabs
-    tab1, tab2, tab3, tab4, tab5 = st.tabs([
-    get_tab_label("Model", "model_ref", True),
-    get_tab_label("Outfit", "outfit", True),
-    get_tab_label("Accessories & Jewelry", "accessories", False),
-    get_tab_label("Environment & Photography", "environment", True),
-    get_tab_label("Output", "output", True)
-    ])
+    # Remember the labels drawn so fragments can tell when they go stale
+    st.session_state["_tab_labels"] = get_tab_labels()
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(st.session_state["_tab_labels"])
 
     # Model Reference Tab
     with tab1:
-        st.markdown("### Model Reference")
-        st.caption("Define the model's appearance - face, body type, and characteristics")
-        
-        with st.container():
-            model_data = render_input_section("model_ref", "Model")
-            
-            # Additional model options
-            st.divider()
-            col1, col2 = st.columns(2)
-            with col1:
-                model_action = st.radio(
-                    "Model Face",
-                    ["Keep from reference", "Generate new"],
-                    key="model_action",
-                    horizontal=True
-                )
-            
-            if model_action == "Generate new":
-                st.text_area(
-                    "Model Description",
-                    key="model_new_description",
-                    height=100,
-                    placeholder="Describe the model's appearance (e.g., ethnicity, hair color, age, facial features, etc.)"
-                )
-            
-            # Hair styling (moved from Photography tab)
-            st.divider()
-            st.markdown("##### Hair Styling")
-            st.text_input(
-                "Hair Description (Optional)",
-                key="hair_text",
-                placeholder="e.g., Sleek bun, loose waves"
-            )
-            
-            hair_file = st.file_uploader(
-                "Upload Hair Reference (Optional)",
-                type=['jpg', 'jpeg', 'png'],
-                key="hair_file"
-            )
-            if hair_file:
-                handle_image_upload(hair_file, "hair", "hair")
+        _render_model_tab()
 
     # Outfit Tab
     with tab2:
-        st.markdown("### Base Outfit")
-        st.caption("Define the main clothing items for the photoshoot")
-        
-        with st.container():
-            outfit_data = render_input_section("outfit", "Outfit", show_preservation=False)
+        _render_outfit_tab()
 
     # Accessories & Jewelry Tab (Combined)
     with tab3:
-        st.markdown("### Accessories & Jewelry")
-        st.caption("Add accessories and configure jewelry for each body location")
-        
-        # Additional Items Section
-        st.markdown("##### Additional Items")
-        st.caption("Add optional accessories like bags, hats, scarves, sunglasses, etc.")
-        
-        with st.container():
-            # Display existing items
-            if st.session_state.additional_items:
-                st.markdown("**Added Items**")
-                for i, item in enumerate(st.session_state.additional_items):
-                    col1, col2, col3 = st.columns([2, 2, 1])
-                    with col1:
-                        st.text(f"{item['type']}")
-                    with col2:
-                        st.caption(item.get('text', '')[:30] + "..." if item.get('text') else "Image reference")
-                    with col3:
-                        if st.button("Remove", key=f"remove_item_{i}"):
-                            st.session_state.additional_items.pop(i)
-                            st.rerun()
-            
-            st.divider()
-            
-            # Add new item
-            st.markdown("**Add New Item**")
-            col1, col2 = st.columns([1, 2])
-            
-            with col1:
-                item_type = st.selectbox(
-                    "Item Type",
-                    ["Bag", "Hat", "Scarf", "Sunglasses", "Other"],
-                    key="new_item_type"
-                )
-            
-            # Show all input options
-            new_item_text = st.text_area(
-                "Item Description (Optional)",
-                key="new_item_text",
-                height=80,
-                placeholder=f"Describe the {item_type.lower()}..."
-            )
-            
-            item_file = st.file_uploader(
-                "Upload Item Image (Optional)",
-                type=['jpg', 'jpeg', 'png'],
-                key="new_item_file"
-            )
-            if item_file:
-                handle_image_upload(item_file, "item", "new_item")
-            
-            new_item_url = st.session_state.get("new_item_url", "")
-            
-            if st.button("Add Item", type="secondary"):
-                new_item = {
-                    "type": item_type.lower(),
-                    "text": new_item_text,
-                    "image_url": new_item_url
-                }
-                st.session_state.additional_items.append(new_item)
-                st.success(f"Added {item_type}")
-                st.rerun()
-            
-            st.divider()
-            
-            # Jewelry Section
-            st.markdown("##### Jewelry")
-            st.caption("Configure jewelry for each body location")
-            
-            jewelry_locations = [
-                ("Neck", "jewelry_neck", "Necklaces, chains, pendants"),
-                ("Ears", "jewelry_ears", "Earrings, ear cuffs"),
-                ("Hands/Wrists", "jewelry_hands", "Rings, bracelets, watches")
-            ]
-            
-            for location_name, location_key, description in jewelry_locations:
-                with st.expander(f"{location_name} - {description}", expanded=False):
-                    # Show all input options - if user adds input, it will be used
-                    st.text_input(
-                        f"{location_name} Description (Optional)",
-                        key=f"{location_key}_text",
-                        placeholder=f"e.g., Gold chain necklace with pendant"
-                    )
-                    
-                    jewelry_file = st.file_uploader(
-                        f"Upload {location_name} Reference (Optional)",
-                        type=['jpg', 'jpeg', 'png'],
-                        key=f"{location_key}_file"
-                    )
-                    if jewelry_file:
-                        handle_image_upload(jewelry_file, location_key, location_key)
+        _render_accessories_tab()
 
     # Environment & Photography Tab (Combined)
     with tab4:
-        st.markdown("### Environment & Photography")
-        st.caption("Set the scene and configure visual style and camera settings")
-        
-        # Environment Section
-        st.markdown("##### Environment & Background")
-        
-        with st.container():
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                env_category = st.selectbox(
-                    "Environment Category",
-                    ["Studio", "Indoor Lifestyle", "Outdoor Urban", "Outdoor Nature"],
-                    key="env_category"
-                )
-            
-            # Show all input options
-            st.text_area(
-                "Background Description (Optional)",
-                key="environment_text",
-                height=100,
-                placeholder="Describe the background/environment in detail...\ne.g., Abstract curved peach and warm beige walls with soft shadows"
-            )
-            
-            bg_file = st.file_uploader(
-                "Upload Background Reference (Optional)",
-                type=['jpg', 'jpeg', 'png'],
-                key="environment_file"
-            )
-            if bg_file:
-                handle_image_upload(bg_file, "background", "environment")
-            
-            st.divider()
-            
-            # Photography Section
-            st.markdown("##### Photography Settings")
-            
-            with st.container():
-                col1, col2, col3 = st.columns(3)
-                
-                with col1:
-                    st.markdown("**Aesthetic**")
-                    aesthetic = st.selectbox(
-                        "Style",
-                        ["Editorial", "Commercial", "Lifestyle", "High Fashion", "Casual"],
-                        key="photo_aesthetic",
-                        label_visibility="collapsed"
-                    )
-                
-                with col2:
-                    st.markdown("**Framing**")
-                    framing = st.selectbox(
-                        "Frame",
-                        ["Full Body", "3/4 Body", "Waist Up", "Close Up"],
-                        key="photo_framing",
-                        label_visibility="collapsed"
-                    )
-                
-                with col3:
-                    st.markdown("**Lighting**")
-                    lighting = st.selectbox(
-                        "Light",
-                        ["Soft Warm", "Studio Clean", "Golden Hour", "Hard Shadows", "Natural"],
-                        key="photo_lighting",
-                        label_visibility="collapsed"
-                    )
-                
-                st.divider()
-                
-                # Shadow settings
-                st.markdown("**Shadows**")
-                shadow_method = st.radio(
-                    "Shadow Input Method",
-                    ["Select from options", "Text description"],
-                    key="shadow_method",
-                    horizontal=True
-                )
-                
-                shadow_value = ""
-                if shadow_method == "Select from options":
-                    shadow_value = st.selectbox(
-                        "Shadow Style",
-                        [
-                            "None - No specific shadow requirements",
-                            "Blend model shadows with background shadows",
-                            "Natural soft shadows",
-                            "Dramatic hard shadows",
-                            "Minimal shadows for clean look",
-                            "Realistic ground shadows",
-                            "Subtle ambient shadows"
-                        ],
-                        key="shadow_option"
-                    )
-                else:
-                    shadow_value = st.text_area(
-                        "Shadow Description",
-                        key="shadow_text",
-                        height=80,
-                        placeholder="e.g., Soft natural shadows that blend seamlessly with the background lighting..."
-                    )
-                
-                # Pose settings
-                st.markdown("**Pose**")
-                st.text_input(
-                    "Pose Description (Optional)",
-                    key="pose_text",
-                    placeholder="e.g., Walking motion, hands in pockets"
-                )
-                
-                col1, col2 = st.columns([2, 1])
-                with col1:
-                    pose_file = st.file_uploader(
-                        "Upload Pose Reference (Optional)",
-                        type=['jpg', 'jpeg', 'png'],
-                        key="pose_file"
-                    )
-                    if pose_file:
-                        handle_image_upload(pose_file, "pose", "pose")
-                with col2:
-                    st.slider("Mimicry Strength", 0.0, 1.0, 0.8, key="pose_strength")
+        _render_environment_tab()
 
     # Output Tab
     with tab5:
-        st.markdown("### Output Settings")
-        st.caption("Configure the final output parameters")
-        
-        with st.container():
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("##### Platform Preset")
-                platform = st.selectbox(
-                    "Platform",
-                    ["Instagram Portrait (4:5)", "Instagram Story (9:16)", "Instagram Square (1:1)", "Default (2:3)"],
-                    key="platform_preset",
-                    label_visibility="collapsed"
-                )
-            
-            with col2:
-                st.markdown("##### Number of Images")
-                image_count = st.number_input(
-                    "Count",
-                    min_value=1,
-                    max_value=10,
-                    value=2,
-                    key="image_count",
-                    label_visibility="collapsed"
-                )
-            
-            st.divider()
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.markdown("##### Batch Variety")
-                batch_variety = st.radio(
-                    "Variety",
-                    ["Subtle Variations", "Dynamic Angles"],
-                    key="batch_variety",
-                    horizontal=True,
-                    label_visibility="collapsed"
-                )
-            
-            with col2:
-                st.markdown("##### Image Quality")
-                image_quality = st.selectbox(
-                    "Quality",
-                    ["1K", "2K", "4K"],
-                    key="image_quality",
-                    index=2,  # Default to 4K
-                    label_visibility="collapsed",
-                    help="Select image resolution: 1K (1024px), 2K (2048px), or 4K (4096px)"
-                )
-            
-            st.divider()
+        _render_output_tab()
 
     # Generate Section - Fixed at bottom (visible across all tabs)
     st.markdown("---")
@@ -973,8 +966,7 @@ else:
             # Configuration preview
             st.markdown("##### Configuration Preview")
             with st.expander("Full Configuration Preview (JSON)", expanded=False):
-                config = build_config()
-                st.json(config)
+                render_config_preview()
 
         with col2:
             st.markdown("##### Ready to Generate?")
@@ -1000,13 +992,15 @@ else:
         # Prepare image parts (returns both image_parts and image_mapping)
         with st.spinner("Preparing images..."):
             try:
+                # Reference downloads are cached per URL by image_utils.url_to_base64
                 image_parts, image_mapping = client.prepare_image_parts(config)
             except Exception as e:
                 st.error(f"Failed to prepare images: {str(e)}")
                 st.stop()
         
-        # Build prompt with image mapping
-        prompt = build_photoshoot_prompt(config, image_mapping)
+        # Build prompt with image mapping. The fixed instructions go out as the
+        # systemInstruction so every request starts with the same prefix.
+        instructions, prompt = build_photoshoot_prompt_sections(config, image_mapping)
         
         # Get aspect ratio
         aspect_ratio = map_platform_preset_to_aspect_ratio(config["meta"]["platform_preset"])
@@ -1017,68 +1011,118 @@ else:
         image_quality = config["output"]["image_quality"]
         
         generated_images = []
-        progress_bar = st.progress(0)
-        status_text = st.empty()
+        # One status container for the whole batch instead of per-image widgets
+        status = st.status(f"Generating {image_count} images...", expanded=False)
+        
+        # Request the whole batch from Gemini in one call, then upload and
+        # thumbnail every returned image concurrently. Widget updates only
+        # happen here on the main thread.
+        received = []
+        
+        def on_generated(i, image):
+            received.append(i)
+            status.update(label=f"{len(received)}/{image_count} images generated")
         
-        for i in range(image_count):
-            status_text.text(f"Generating image {i + 1} of {image_count}...")
-            progress_bar.progress((i + 1) / image_count)
+        try:
+            batch = client.generate_image_batch(
+                prompt,
+                image_parts,
+                aspect_ratio,
+                image_count,
+                batch_variety=batch_variety,
+                image_size=image_quality,
+                system_prompt=instructions,
+                on_image=on_generated
+            )
+        except Exception as e:
+            st.error(f"Error generating images: {str(e)}")
+            batch = []
+        
+        if 0 < len(batch) < image_count:
+            st.error(f"Only {len(batch)} of {image_count} images could be generated")
+        
+        if batch:
+            uploaded = []
             
-            try:
-                image_bytes, mime_type = client.generate_image(
-                    prompt,
-                    image_parts,
-                    aspect_ratio,
-                    batch_index=i,
-                    batch_variety=batch_variety,
-                    image_size=image_quality
-                )
-                
-                with st.spinner(f"Uploading image {i + 1} to S3..."):
-                    upload_result = s3_handler.upload_generated_image(
-                        image_bytes,
-                        mime_type
-                    )
-                
+            def on_uploaded(i, upload_result):
+                mime_type = batch[i][1]
                 if upload_result['success']:
                     generated_images.append({
                         "s3_url": upload_result['public_url'],
                         "s3_key": upload_result['s3_key'],
-                        "bytes": image_bytes,
                         "index": i + 1,
                         "mime_type": mime_type
                     })
                 else:
                     st.error(f"Failed to upload image {i + 1}: {upload_result.get('error')}")
-                    
-            except Exception as e:
-                st.error(f"Error generating image {i + 1}: {str(e)}")
+                
+                uploaded.append(i)
+                status.update(label=f"{len(uploaded)}/{len(batch)} images uploaded")
+            
+            # Downscale in the background while the uploads run
+            thumbnail_pool = _get_thumbnail_pool()
+            thumbnail_futures = [
+                thumbnail_pool.submit(make_thumbnail, image_bytes)
+                for image_bytes, _ in batch
+            ]
+            s3_handler.upload_many(
+                [(image_bytes, mime_type, None) for image_bytes, mime_type in batch],
+                on_complete=on_uploaded
+            )
+            
+            # Host the thumbnails on S3 too, so the results grid can lazy-load them
+            thumbnailed = []
+            for img_data in generated_images:
+                i = img_data["index"] - 1
+                img_data["thumb_url"] = img_data["s3_url"]
+                try:
+                    thumbnailed.append((img_data, thumbnail_futures[i].result()))
+                except Exception as e:
+                    # The upload succeeded, so show the full image rather than drop it
+                    st.warning(f"Could not create a thumbnail for image {i + 1}, showing the full image: {str(e)}")
+            
+            thumb_results = s3_handler.upload_many(
+                [(thumb_bytes, "image/jpeg", "thumbnails") for _, thumb_bytes in thumbnailed]
+            )
+            for (img_data, _), thumb_result in zip(thumbnailed, thumb_results):
+                if thumb_result['success']:
+                    img_data["thumb_url"] = thumb_result['public_url']
         
-        progress_bar.empty()
-        status_text.empty()
+        # Keep results in request order regardless of completion order
+        generated_images.sort(key=lambda img: img["index"])
         
-        # Display results
+        status.update(
+            label=f"Generated {len(generated_images)} of {image_count} images",
+            state="complete" if generated_images else "error"
+        )
+        
+        # Only URLs are kept, so reruns can redisplay the results without
+        # pinning any image bytes in the session
+        st.session_state.generated_images = generated_images
         if generated_images:
             st.success(f"Successfully generated {len(generated_images)} images!")
-            
-            st.markdown("### Generated Images")
-            cols = st.columns(min(len(generated_images), 3))
-            
-            for idx, img_data in enumerate(generated_images):
-                with cols[idx % 3]:
-                    image = Image.open(io.BytesIO(img_data["bytes"]))
-                    st.image(image, caption=f"Image {img_data['index']}", use_container_width=True)
-                    
-                    st.download_button(
-                        label=f"Download",
-                        data=img_data["bytes"],
-                        file_name=f"photoshoot_{img_data['index']}.png",
-                        mime=img_data["mime_type"],
-                        key=f"download_{idx}"
-                    )
-                    
-                    st.caption(f"S3: {img_data['s3_url'][:40]}...")
-            
-            with st.expander("All S3 URLs"):
-                for img_data in generated_images:
-                    st.code(img_data['s3_url'], language=None)
+    
+    # Display results (kept across reruns)
+    generated_images = st.session_state.get("generated_images", [])
+    if generated_images:
+        st.markdown("### Generated Images")
+        cols = st.columns(min(len(generated_images), 3))
+        
+        for idx, img_data in enumerate(generated_images):
+            with cols[idx % 3]:
+                # Off-screen thumbnails defer their S3 fetch and decode until scrolled into view
+                st.markdown(
+                    f'<img src="{html.escape(img_data.get("thumb_url", img_data["s3_url"]))}" loading="lazy" decoding="async" '
+                    f'style="width:100%" alt="Image {img_data["index"]}" />',
+                    unsafe_allow_html=True
+                )
+                st.caption(f"Image {img_data['index']}")
+                
+                # The browser downloads the full-resolution image straight from S3
+                st.link_button("Download", img_data["s3_url"])
+                
+                st.caption(f"S3: {img_data['s3_url'][:40]}...")
+        
+        with st.expander("All S3 URLs"):
+            for img_data in generated_images:
+                st.code(img_data['s3_url'], language=None)
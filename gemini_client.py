@@ -1,160 +1,322 @@
 import os
+import asyncio
+import json
 import requests
-import base64
-from typing import List, Dict, Any, Optional, Tuple
-from image_utils import url_to_base64
+import httpx
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Callable, List, Dict, Any, Optional, Tuple
+from image_utils import b64decode, create_http_session, get_image_mime_type, url_to_base64
 from prompt_builder import map_platform_preset_to_aspect_ratio
 
+# orjson serializes the multi-MB base64 request bodies several times faster than json
+try:
+    import orjson
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+except ImportError:
+    def _dumps(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+    _loads = json.loads
+
+# ijson lets single-image responses be parsed as a stream, so the full JSON
+# document (with its multi-MB base64 string) is never built as a dict
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Maximum number of reference images fetched concurrently
+MAX_FETCH_WORKERS = 8
+
+# Maximum number of concurrent generateContent calls for batch fallbacks
+MAX_GENERATE_WORKERS = 8
+
+# Connection limits for the async HTTP/2 client used by the submit() dispatcher
+ASYNC_CLIENT_LIMITS = httpx.Limits(max_connections=16, max_keepalive_connections=8)
+
+# submit() collects requests for up to this long (seconds) before dispatching them
+BATCH_WINDOW_SECONDS = 0.05
+
+# Maximum number of submitted requests dispatched per window
+BATCH_WINDOW_SIZE = 8
+
+# Prepended to every batch variation prompt so only framing changes between images
+_CONSISTENCY_NOTE = "CRITICAL: Keep the model's face, body figure, outfit, and all items EXACTLY THE SAME as specified. Only vary camera angle, pose positioning, lighting, and composition."
+
+_DYNAMIC_VARIATIONS = (
+    "Slightly different camera angle",
+    "Different pose variation",
+    "Alternative composition",
+    "Varied perspective",
+    "Different lighting angle",
+    "Alternative framing",
+    "Shifted viewpoint",
+    "New angle approach",
+    "Fresh perspective",
+    "Different positioning",
+)
+
+# Subtle variations - minor changes
+_SUBTLE_VARIATIONS = (
+    "Slight variation in expression",
+    "Minor pose adjustment",
+    "Subtle lighting change",
+    "Small composition shift",
+    "Gentle variation",
+)
+
+# Batch-wide variety notes for candidateCount requests, where every candidate shares one prompt
+_BATCH_VARIETY_NOTES = {
+    "dynamic_angles": "Use a noticeably different camera angle, pose, or composition for each image.",
+    "subtle_variations": "Keep the differences between images subtle: slight changes in expression, pose, or lighting.",
+}
+
+_VARIETY = {
+    "dynamic_angles": _DYNAMIC_VARIATIONS,
+    "subtle_variations": _SUBTLE_VARIATIONS,
+}
+
+
+# Label parts that precede each reference image. They are the same for every
+# request, so the parts list reuses these dicts by reference.
+_MODEL_KEEP_FACE_TEXT = {"text": "REFERENCE IMAGE 1 - MODEL: This image shows the model reference. CRITICAL: Extract ONLY the model's face and body figure from this image. IGNORE the background, clothing, outfit, accessories, jewelry, and any other elements. Use ONLY the face features (eyes, nose, mouth, facial structure, skin tone) and body proportions/figure. The exact same face must be used in the generated image."}
+_MODEL_BODY_ONLY_TEXT = {"text": "REFERENCE IMAGE 1 - MODEL: This image shows the model reference. CRITICAL: Extract ONLY the model's body figure and proportions from this image. IGNORE the face, background, clothing, outfit, accessories, jewelry, and any other elements. Use ONLY the body proportions and figure structure."}
+_OUTFIT_TEXT = {"text": "REFERENCE IMAGE - OUTFIT: This image shows the outfit/clothing to be worn. CRITICAL: Extract ONLY the clothing/outfit from this image. IGNORE any person, model, face, body, background, or other elements in this image. If there is a person wearing the outfit, extract ONLY the clothing items (shirt, dress, pants, etc.) and ignore the person completely. REPLACE the model's clothing with ONLY the outfit extracted from this image."}
+_NECK_JEWELRY_TEXT = {"text": "REFERENCE IMAGE - NECK JEWELRY: This image shows the necklace/jewelry to wear around the neck. CRITICAL: Extract ONLY the necklace/jewelry from this image. IGNORE any person, model, face, body, background, or other elements. If there is a person wearing the jewelry, extract ONLY the jewelry item itself and ignore the person completely. Apply ONLY the extracted jewelry to the neck area."}
+_EAR_JEWELRY_TEXT = {"text": "REFERENCE IMAGE - EAR JEWELRY: This image shows the earrings/jewelry to wear on the ears. CRITICAL: Extract ONLY the earrings/jewelry from this image. IGNORE any person, model, face, body, background, or other elements. If there is a person wearing the jewelry, extract ONLY the jewelry item itself and ignore the person completely. Apply ONLY the extracted jewelry to the ears."}
+_HAND_JEWELRY_TEXT = {"text": "REFERENCE IMAGE - HAND/WRIST JEWELRY: This image shows the rings/bracelets to wear on hands and wrists. CRITICAL: Extract ONLY the rings/bracelets/jewelry from this image. IGNORE any person, model, face, body, background, or other elements. If there is a person wearing the jewelry, extract ONLY the jewelry item itself and ignore the person completely. Apply ONLY the extracted jewelry to the hands and wrists."}
+_ENVIRONMENT_TEXT = {"text": "REFERENCE IMAGE - BACKGROUND: This image shows the background/environment to use for the photoshoot. CRITICAL: Extract ONLY the background/environment/scene from this image. IGNORE any person, model, face, body, clothing, or other foreground elements. Use ONLY the background, environment, and scene setting from this image."}
+_POSE_TEXT = {"text": "REFERENCE IMAGE - POSE: This image shows the pose to mimic. CRITICAL: Extract ONLY the body pose, positioning, and stance from this image. IGNORE the face, clothing, outfit, background, and other elements. Use ONLY the body positioning, pose, and stance from this image."}
+_HAIR_TEXT = {"text": "REFERENCE IMAGE - HAIRSTYLE: This image shows the hairstyle to apply. CRITICAL: Extract ONLY the hairstyle, hair texture, and hair styling from this image. IGNORE the face features, body, clothing, background, and other elements. Use ONLY the hairstyle and hair appearance from this image."}
+
+# Label parts for the old input_assets config structure
+_LEGACY_PRIMARY_TEXT = {"text": "REFERENCE IMAGE - PRIMARY CLOTHING: This is the main clothing reference image."}
+_LEGACY_POSE_TEXT = {"text": "REFERENCE IMAGE - POSE: This image shows the pose to mimic."}
+_LEGACY_ACCESSORY_TEXT = {"text": "REFERENCE IMAGE - ACCESSORY: This image shows an accessory to add."}
+_LEGACY_BACKGROUND_TEXT = {"text": "REFERENCE IMAGE - BACKGROUND: This image shows the background to use."}
+
+
+def _model_ref_text(model_ref: Dict[str, Any]) -> Dict[str, str]:
+    """Model reference label - keeps the face unless face_action says otherwise"""
+    if model_ref.get("face_action", "keep") == "keep":
+        return _MODEL_KEEP_FACE_TEXT
+    return _MODEL_BODY_ONLY_TEXT
+
+
+def _item_text(item: Dict[str, Any]) -> Dict[str, str]:
+    """Additional item label part for the item's type"""
+    return _item_text_for_type(item.get("type", "item"))
+
+
+@lru_cache(maxsize=64)
+def _item_text_for_type(item_type: str) -> Dict[str, str]:
+    """Build (once per item type) the label part for an additional item"""
+    return {"text": f"REFERENCE IMAGE - ADDITIONAL ITEM ({item_type.upper()}): This image shows a {item_type} to add to the outfit. CRITICAL: Extract ONLY the {item_type} from this image. IGNORE any person, model, face, body, background, or other elements. If there is a person wearing or holding the {item_type}, extract ONLY the {item_type} itself and ignore the person completely."}
+
+
+def _item_desc(item: Dict[str, Any]) -> str:
+    return f"the {item.get('type', 'item')} reference image"
+
+
+def _system_instruction(system_prompt: str) -> Dict[str, Any]:
+    """systemInstruction content for generateContent. It precedes contents, so
+    identical instructions give every request the same cacheable prefix."""
+    return {"parts": [{"text": system_prompt}]}
+
+
+# Reference images in prompt order, as
+# (section_path, url_field, label_part, mapping_key, mapping_desc, enabled_field).
+# label_part/mapping_desc may be callables taking the section dict. A section that
+# is a list (additional items) yields one image per entry, with "_{index}" appended
+# to mapping_key.
+_IMAGE_PARTS_SCHEMA = (
+    # Model reference image
+    (("model_reference",), "image_url", _model_ref_text,
+     "model_ref", "the model reference image (Image 1)", None),
+    
+    # Base outfit image - IMPORTANT: This replaces the model's outfit
+    (("base_outfit",), "image_url",
+     _OUTFIT_TEXT,
+     "outfit", "the outfit image (which replaces the model's clothing)", None),
+    
+    # Additional items images
+    (("additional_items",), "image_url", _item_text, "item", _item_desc, None),
+    
+    # Jewelry images - each with explicit location mapping
+    (("jewelry", "neck"), "image_url",
+     _NECK_JEWELRY_TEXT,
+     "jewelry_neck", "the neck jewelry reference image", "enabled"),
+    (("jewelry", "ears"), "image_url",
+     _EAR_JEWELRY_TEXT,
+     "jewelry_ears", "the ear jewelry reference image", "enabled"),
+    (("jewelry", "hands_wrists"), "image_url",
+     _HAND_JEWELRY_TEXT,
+     "jewelry_hands", "the hand/wrist jewelry reference image", "enabled"),
+    
+    # Environment/background image
+    (("environment",), "image_url",
+     _ENVIRONMENT_TEXT,
+     "environment", "the background/environment reference image", None),
+    
+    # Photography references
+    (("photography", "pose"), "image_url",
+     _POSE_TEXT,
+     "pose", "the pose reference image", None),
+    (("photography", "hair"), "image_url",
+     _HAIR_TEXT,
+     "hair", "the hairstyle reference image", None),
+)
+
+# Same record layout for the old input_assets config structure
+_LEGACY_IMAGE_PARTS_SCHEMA = (
+    # Primary clothing reference (required)
+    (("input_assets", "primary_clothing_reference"), "url",
+     _LEGACY_PRIMARY_TEXT,
+     "primary_clothing", "the primary clothing reference image", None),
+    
+    # Auxiliary references
+    (("input_assets", "auxiliary_references"), "pose_ref_url",
+     _LEGACY_POSE_TEXT,
+     "pose", "the pose reference image", None),
+    (("input_assets", "auxiliary_references"), "accessory_ref_url",
+     _LEGACY_ACCESSORY_TEXT,
+     "accessory", "the accessory reference image", None),
+    (("input_assets", "auxiliary_references"), "background_ref_url",
+     _LEGACY_BACKGROUND_TEXT,
+     "background", "the background reference image", None),
+)
+
 
 class GeminiPhotoshootClient:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, file_uri_prefixes: Tuple[str, ...] = ()):
+        """
+        Args:
+            api_key: Gemini API key
+            file_uri_prefixes: URL prefixes (e.g. our own S3/CloudFront origin) for
+                images Gemini can fetch itself. Matching references are sent as
+                fileData URIs instead of being downloaded and base64 encoded.
+        """
         self.api_key = api_key
+        self.file_uri_prefixes = tuple(file_uri_prefixes)
         self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-3-pro-image-preview:generateContent"
+        self.session = create_http_session()
+        # Cleared once the model rejects or ignores candidateCount, so later
+        # batches go straight to per-image requests
+        self.candidate_count_supported = True
+        # One (queue, dispatcher task) pair per running event loop, keyed by id(loop).
+        # Entries are dropped on close_dispatcher() or when the task ends; see submit()
+        self._dispatchers = {}
     
-    def _add_image_part(self, parts: List[Dict], image_url: str) -> None:
-        """Helper to add an image part from URL"""
-        if image_url:
-            try:
-                base64_data = url_to_base64(image_url)
-                parts.append({
-                    "inlineData": {
-                        "mimeType": "image/jpeg",
-                        "data": base64_data
-                    }
-                })
-            except Exception as e:
-                print(f"Warning: Failed to load image from {image_url}: {e}")
+    def _fetch_image_part(self, image_url: str) -> Optional[Dict[str, Any]]:
+        """Helper to fetch an image part from URL (returns None if it cannot be loaded)"""
+        if self.file_uri_prefixes and image_url.startswith(self.file_uri_prefixes):
+            # Gemini fetches the image from our bucket - no download or base64 round-trip
+            return {
+                "fileData": {
+                    "mimeType": get_image_mime_type(image_url.split('?')[0]),
+                    "fileUri": image_url
+                }
+            }
+        
+        # Transient 429/5xx and connection errors are already retried with backoff by
+        # the shared session's adapter (see create_http_session), so only persistent
+        # failures reach the warning below
+        try:
+            base64_data = url_to_base64(image_url)
+        except Exception as e:
+            print(f"Warning: Failed to load image from {image_url}: {e}")
+            return None
+        return {
+            "inlineData": {
+                "mimeType": "image/jpeg",
+                "data": base64_data
+            }
+        }
     
-    def prepare_image_parts(self, config: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+    def _build_image_parts(
+        self,
+        jobs: List[Tuple[Dict[str, str], str, str, str]]
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
         """
-        Prepare image parts for Gemini API from URLs in the new config structure.
-        Collects images from all sections with explicit labels.
+        Fetch all reference images in parallel and assemble the labelled parts.
+        
+        Args:
+            jobs: (label_part, image_url, mapping_key, mapping_desc) tuples in prompt order
         
         Returns:
-            Tuple of (image_parts_list, image_mapping_dict)
-            image_mapping_dict maps image labels to their descriptions for prompt building
+            Tuple of (image_parts_list, image_mapping_dict), in the same order as jobs
         """
         parts = []
         image_mapping = {}  # Maps image label to description
+        if not jobs:
+            return parts, image_mapping
         
-        # Model reference image
-        model_ref = config.get("model_reference", {})
-        if model_ref.get("image_url"):
-            face_action = model_ref.get("face_action", "keep")
-            if face_action == "keep":
-                parts.append({"text": "REFERENCE IMAGE 1 - MODEL: This image shows the model reference. CRITICAL: Extract ONLY the model's face and body figure from this image. IGNORE the background, clothing, outfit, accessories, jewelry, and any other elements. Use ONLY the face features (eyes, nose, mouth, facial structure, skin tone) and body proportions/figure. The exact same face must be used in the generated image."})
-            else:
-                parts.append({"text": "REFERENCE IMAGE 1 - MODEL: This image shows the model reference. CRITICAL: Extract ONLY the model's body figure and proportions from this image. IGNORE the face, background, clothing, outfit, accessories, jewelry, and any other elements. Use ONLY the body proportions and figure structure."})
-            self._add_image_part(parts, model_ref["image_url"])
-            image_mapping["model_ref"] = "the model reference image (Image 1)"
-        
-        # Base outfit image - IMPORTANT: This replaces the model's outfit
-        outfit = config.get("base_outfit", {})
-        if outfit.get("image_url"):
-            parts.append({"text": "REFERENCE IMAGE - OUTFIT: This image shows the outfit/clothing to be worn. CRITICAL: Extract ONLY the clothing/outfit from this image. IGNORE any person, model, face, body, background, or other elements in this image. If there is a person wearing the outfit, extract ONLY the clothing items (shirt, dress, pants, etc.) and ignore the person completely. REPLACE the model's clothing with ONLY the outfit extracted from this image."})
-            self._add_image_part(parts, outfit["image_url"])
-            image_mapping["outfit"] = "the outfit image (which replaces the model's clothing)"
-        
-        # Additional items images
-        additional_items = config.get("additional_items", [])
-        item_counter = 0
-        for idx, item in enumerate(additional_items):
-            if item.get("image_url"):
-                item_type = item.get("type", "item")
-                item_counter += 1
-                parts.append({"text": f"REFERENCE IMAGE - ADDITIONAL ITEM ({item_type.upper()}): This image shows a {item_type} to add to the outfit. CRITICAL: Extract ONLY the {item_type} from this image. IGNORE any person, model, face, body, background, or other elements. If there is a person wearing or holding the {item_type}, extract ONLY the {item_type} itself and ignore the person completely."})
-                self._add_image_part(parts, item["image_url"])
-                image_mapping[f"item_{idx}"] = f"the {item_type} reference image"
-        
-        # Jewelry images - each with explicit location mapping
-        jewelry = config.get("jewelry", {})
-        
-        # Neck jewelry
-        neck = jewelry.get("neck", {})
-        if neck.get("enabled") and neck.get("image_url"):
-            parts.append({"text": "REFERENCE IMAGE - NECK JEWELRY: This image shows the necklace/jewelry to wear around the neck. CRITICAL: Extract ONLY the necklace/jewelry from this image. IGNORE any person, model, face, body, background, or other elements. If there is a person wearing the jewelry, extract ONLY the jewelry item itself and ignore the person completely. Apply ONLY the extracted jewelry to the neck area."})
-            self._add_image_part(parts, neck["image_url"])
-            image_mapping["jewelry_neck"] = "the neck jewelry reference image"
-        
-        # Ear jewelry
-        ears = jewelry.get("ears", {})
-        if ears.get("enabled") and ears.get("image_url"):
-            parts.append({"text": "REFERENCE IMAGE - EAR JEWELRY: This image shows the earrings/jewelry to wear on the ears. CRITICAL: Extract ONLY the earrings/jewelry from this image. IGNORE any person, model, face, body, background, or other elements. If there is a person wearing the jewelry, extract ONLY the jewelry item itself and ignore the person completely. Apply ONLY the extracted jewelry to the ears."})
-            self._add_image_part(parts, ears["image_url"])
-            image_mapping["jewelry_ears"] = "the ear jewelry reference image"
-        
-        # Hands/wrists jewelry
-        hands = jewelry.get("hands_wrists", {})
-        if hands.get("enabled") and hands.get("image_url"):
-            parts.append({"text": "REFERENCE IMAGE - HAND/WRIST JEWELRY: This image shows the rings/bracelets to wear on hands and wrists. CRITICAL: Extract ONLY the rings/bracelets/jewelry from this image. IGNORE any person, model, face, body, background, or other elements. If there is a person wearing the jewelry, extract ONLY the jewelry item itself and ignore the person completely. Apply ONLY the extracted jewelry to the hands and wrists."})
-            self._add_image_part(parts, hands["image_url"])
-            image_mapping["jewelry_hands"] = "the hand/wrist jewelry reference image"
-        
-        # Environment/background image
-        environment = config.get("environment", {})
-        if environment.get("image_url"):
-            parts.append({"text": "REFERENCE IMAGE - BACKGROUND: This image shows the background/environment to use for the photoshoot. CRITICAL: Extract ONLY the background/environment/scene from this image. IGNORE any person, model, face, body, clothing, or other foreground elements. Use ONLY the background, environment, and scene setting from this image."})
-            self._add_image_part(parts, environment["image_url"])
-            image_mapping["environment"] = "the background/environment reference image"
-        
-        # Photography references
-        photography = config.get("photography", {})
-        
-        # Pose reference image
-        pose = photography.get("pose", {})
-        if pose.get("image_url"):
-            parts.append({"text": "REFERENCE IMAGE - POSE: This image shows the pose to mimic. CRITICAL: Extract ONLY the body pose, positioning, and stance from this image. IGNORE the face, clothing, outfit, background, and other elements. Use ONLY the body positioning, pose, and stance from this image."})
-            self._add_image_part(parts, pose["image_url"])
-            image_mapping["pose"] = "the pose reference image"
-        
-        # Hair reference image
-        hair = photography.get("hair", {})
-        if hair.get("image_url"):
-            parts.append({"text": "REFERENCE IMAGE - HAIRSTYLE: This image shows the hairstyle to apply. CRITICAL: Extract ONLY the hairstyle, hair texture, and hair styling from this image. IGNORE the face features, body, clothing, background, and other elements. Use ONLY the hairstyle and hair appearance from this image."})
-            self._add_image_part(parts, hair["image_url"])
-            image_mapping["hair"] = "the hairstyle reference image"
+        with ThreadPoolExecutor(max_workers=min(len(jobs), MAX_FETCH_WORKERS)) as executor:
+            image_parts = list(executor.map(self._fetch_image_part, [job[1] for job in jobs]))
+        
+        for (label_part, _, mapping_key, mapping_desc), image_part in zip(jobs, image_parts):
+            parts.append(label_part)
+            if image_part:
+                parts.append(image_part)
+            image_mapping[mapping_key] = mapping_desc
         
         return parts, image_mapping
     
+    def _schema_jobs(
+        self,
+        config: Dict[str, Any],
+        schema: Tuple[Tuple, ...]
+    ) -> List[Tuple[Dict[str, str], str, str, str]]:
+        """
+        Walk a reference-image schema and collect the fetch jobs for _build_image_parts.
+        
+        Args:
+            config: Configuration dictionary
+            schema: Records of (section_path, url_field, label_part, mapping_key,
+                mapping_desc, enabled_field) - see _IMAGE_PARTS_SCHEMA
+        
+        Returns:
+            (label_part, image_url, mapping_key, mapping_desc) tuples in schema order
+        """
+        jobs = []
+        for section_path, url_field, label_part, mapping_key, mapping_desc, enabled_field in schema:
+            section = config
+            for key in section_path:
+                section = section.get(key) or {}
+            
+            # List sections (additional items) produce one job per entry, keyed by index
+            entries = enumerate(section) if isinstance(section, list) else [(None, section)]
+            for idx, entry in entries:
+                if not entry.get(url_field):
+                    continue
+                if enabled_field and not entry.get(enabled_field):
+                    continue
+                jobs.append((
+                    label_part(entry) if callable(label_part) else label_part,
+                    entry[url_field],
+                    mapping_key if idx is None else f"{mapping_key}_{idx}",
+                    mapping_desc(entry) if callable(mapping_desc) else mapping_desc
+                ))
+        return jobs
+    
+    def prepare_image_parts(self, config: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
+        """
+        Prepare image parts for Gemini API from URLs in the new config structure.
+        Collects images from all sections with explicit labels.
+        
+        Returns:
+            Tuple of (image_parts_list, image_mapping_dict)
+            image_mapping_dict maps image labels to their descriptions for prompt building
+        """
+        return self._build_image_parts(self._schema_jobs(config, _IMAGE_PARTS_SCHEMA))
+    
     def prepare_image_parts_legacy(self, config: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
         """
         Prepare image parts from old config structure (backward compatibility).
         Returns same format as prepare_image_parts for consistency.
         """
-        parts = []
-        image_mapping = {}
-        
-        # Primary clothing reference (required)
-        primary_ref = config.get("input_assets", {}).get("primary_clothing_reference", {})
-        primary_url = primary_ref.get("url")
-        
-        if primary_url:
-            parts.append({"text": "REFERENCE IMAGE - PRIMARY CLOTHING: This is the main clothing reference image."})
-            self._add_image_part(parts, primary_url)
-            image_mapping["primary_clothing"] = "the primary clothing reference image"
-        
-        # Auxiliary references
-        aux_refs = config.get("input_assets", {}).get("auxiliary_references", {})
-        
-        # Pose reference
-        if aux_refs.get("pose_ref_url"):
-            parts.append({"text": "REFERENCE IMAGE - POSE: This image shows the pose to mimic."})
-            self._add_image_part(parts, aux_refs["pose_ref_url"])
-            image_mapping["pose"] = "the pose reference image"
-        
-        # Accessory reference
-        if aux_refs.get("accessory_ref_url"):
-            parts.append({"text": "REFERENCE IMAGE - ACCESSORY: This image shows an accessory to add."})
-            self._add_image_part(parts, aux_refs["accessory_ref_url"])
-            image_mapping["accessory"] = "the accessory reference image"
-        
-        # Background reference
-        if aux_refs.get("background_ref_url"):
-            parts.append({"text": "REFERENCE IMAGE - BACKGROUND: This image shows the background to use."})
-            self._add_image_part(parts, aux_refs["background_ref_url"])
-            image_mapping["background"] = "the background reference image"
-        
-        return parts, image_mapping
+        return self._build_image_parts(self._schema_jobs(config, _LEGACY_IMAGE_PARTS_SCHEMA))
     
     def generate_image(
         self,
@@ -163,7 +325,8 @@ class GeminiPhotoshootClient:
         aspect_ratio: str,
         batch_index: Optional[int] = None,
         batch_variety: Optional[str] = None,
-        image_size: str = "4K"
+        image_size: str = "4K",
+        system_prompt: Optional[str] = None
     ) -> Tuple[bytes, str]:
         """
         Generate image using Gemini API
@@ -175,48 +338,52 @@ class GeminiPhotoshootClient:
             batch_index: Index for batch generation (for variations)
             batch_variety: Type of variety ("subtle_variations" or "dynamic_angles")
             image_size: Image resolution - "1K", "2K", or "4K" (default: "4K")
+            system_prompt: Fixed instructions sent as the systemInstruction, e.g. the
+                first half of prompt_builder.build_photoshoot_prompt_sections
         
         Returns:
             Tuple of (image_bytes, mime_type)
         """
+        request_body = self._build_generate_request(
+            prompt,
+            image_parts,
+            aspect_ratio,
+            batch_index=batch_index,
+            batch_variety=batch_variety,
+            image_size=image_size,
+            system_prompt=system_prompt
+        )
         
+        # Call Gemini API and extract the image from the response
+        return self._post_generate_image(request_body)
+    
+    def _build_generate_request(
+        self,
+        prompt: str,
+        image_parts: List[Dict[str, Any]],
+        aspect_ratio: str,
+        batch_index: Optional[int] = None,
+        batch_variety: Optional[str] = None,
+        image_size: str = "4K",
+        system_prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Build the generateContent request body, adding batch variations to the prompt"""
         # Add variation for batch generation
         # CRITICAL: Model face, figure, outfit, and all items must remain EXACTLY THE SAME across all batch outputs
-        consistency_note = "CRITICAL: Keep the model's face, body figure, outfit, and all items EXACTLY THE SAME as specified. Only vary camera angle, pose positioning, lighting, and composition."
-        
         final_prompt = prompt
-        if batch_index is not None and batch_variety == "dynamic_angles":
-            variations = [
-                "Slightly different camera angle",
-                "Different pose variation",
-                "Alternative composition",
-                "Varied perspective",
-                "Different lighting angle",
-                "Alternative framing",
-                "Shifted viewpoint",
-                "New angle approach",
-                "Fresh perspective",
-                "Different positioning"
-            ]
-            variation_text = variations[batch_index % len(variations)]
-            final_prompt = f"{consistency_note} {variation_text}. {prompt}"
-        elif batch_index is not None and batch_variety == "subtle_variations":
-            # Subtle variations - minor changes
-            variations = [
-                "Slight variation in expression",
-                "Minor pose adjustment",
-                "Subtle lighting change",
-                "Small composition shift",
-                "Gentle variation"
-            ]
-            variation_text = variations[batch_index % len(variations)]
-            final_prompt = f"{consistency_note} {variation_text}. {prompt}"
-        elif batch_index is not None:
-            # If batch_index is provided but no variety specified, still add consistency note
-            final_prompt = f"{consistency_note} {prompt}"
-        
-        # Build request parts: text prompt first, then interleaved text+image parts
-        parts = [{"text": final_prompt}] + image_parts
+        if batch_index is not None:
+            variations = _VARIETY.get(batch_variety)
+            if variations:
+                final_prompt = _CONSISTENCY_NOTE + " " + variations[batch_index % len(variations)] + ". " + prompt
+            else:
+                # If batch_index is provided but no variety specified, still add consistency note
+                final_prompt = _CONSISTENCY_NOTE + " " + prompt
+        
+        # Build request parts: text prompt first, then interleaved text+image parts.
+        # The image parts are shared as-is between variations (only the leading
+        # text part differs), so their dicts and base64 payloads are never copied.
+        parts = [None] + image_parts
+        parts[0] = {"text": final_prompt}
         
         request_body = {
             "contents": [{
@@ -231,45 +398,479 @@ class GeminiPhotoshootClient:
                 }
             }
         }
+        if system_prompt:
+            request_body["systemInstruction"] = _system_instruction(system_prompt)
         
-        # Call Gemini API
-        response = requests.post(
+        return request_body
+    
+    def _request_headers(self) -> Dict[str, str]:
+        """Headers for generateContent requests"""
+        return {
+            "Content-Type": "application/json",
+            "x-goog-api-key": self.api_key
+        }
+    
+    def _post_generate(self, request_body: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a generateContent request and return the parsed JSON response"""
+        response = self.session.post(
             self.base_url,
-            headers={
-                "Content-Type": "application/json",
-                "x-goog-api-key": self.api_key
-            },
-            json=request_body,
+            headers=self._request_headers(),
+            data=_dumps(request_body),
             timeout=300
         )
         
         response.raise_for_status()
-        response_data = response.json()
+        return _loads(response.content)
+    
+    def _post_generate_image(self, request_body: Dict[str, Any]) -> Tuple[bytes, str]:
+        """
+        Send a generateContent request and return the first candidate's image.
+        
+        With ijson installed the response is parsed as it streams in, keeping only
+        the image's base64 string rather than the whole decoded JSON document.
+        
+        Returns:
+            Tuple of (image_bytes, mime_type)
+        """
+        if ijson is None:
+            return self._extract_response_image(self._post_generate(request_body))
         
-        # Extract image from response
+        with self.session.post(
+            self.base_url,
+            headers=self._request_headers(),
+            data=_dumps(request_body),
+            timeout=300,
+            stream=True
+        ) as response:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            
+            # Tracked so failures report the same errors as _extract_response_image
+            found_candidate = False
+            candidate_empty = True
+            has_parts = False
+            inline = {}
+            for prefix, event, value in ijson.parse(response.raw):
+                if prefix == "candidates.item":
+                    if event == "map_key":
+                        candidate_empty = False
+                    elif event != "end_map":
+                        if found_candidate:
+                            # Only the first candidate is used, as in _extract_response_image
+                            break
+                        found_candidate = True
+                elif prefix == "candidates.item.content.parts.item":
+                    has_parts = True
+                elif prefix == "candidates.item.content.parts.item.inlineData":
+                    if event == "start_map":
+                        inline = {}
+                    elif event == "end_map":
+                        data = inline.get("data")
+                        mime_type = inline.get("mimeType", "")
+                        if data and mime_type.startswith("image/"):
+                            return b64decode(data), mime_type
+                elif prefix.startswith("candidates.item.content.parts.item.inlineData.") and event == "string":
+                    inline[prefix.rsplit(".", 1)[1]] = value
+        
+        if not found_candidate or candidate_empty:
+            raise ValueError("Invalid response format: no candidates found")
+        if not has_parts:
+            raise ValueError("Invalid response format: no content parts found")
+        raise ValueError("No image data found in Gemini response")
+    
+    def _extract_response_image(self, response_data: Dict[str, Any]) -> Tuple[bytes, str]:
+        """Extract and decode the image from the first candidate of a response"""
         if not response_data.get("candidates") or not response_data["candidates"][0]:
             raise ValueError("Invalid response format: no candidates found")
         
-        candidate = response_data["candidates"][0]
-        if not candidate.get("content") or not candidate["content"].get("parts"):
+        return self._extract_candidate_image(response_data["candidates"][0])
+    
+    def _extract_candidate_image(self, candidate: Dict[str, Any]) -> Tuple[bytes, str]:
+        """Extract and decode the image from a single response candidate"""
+        parts = (candidate.get("content") or {}).get("parts")
+        if not parts:
             raise ValueError("Invalid response format: no content parts found")
         
-        # Find image part
-        image_part = None
-        for part in candidate["content"]["parts"]:
-            if part.get("inlineData") and part["inlineData"].get("mimeType", "").startswith("image/"):
-                image_part = part
-                break
+        # Image-preview responses normally carry the image as the first part
+        inline = parts[0].get("inlineData") if parts[0] else None
+        if inline and inline.get("data") and inline.get("mimeType", "").startswith("image/"):
+            return b64decode(inline["data"]), inline["mimeType"]
+        
+        # Otherwise decode the first image part that carries data
+        for part in parts:
+            inline = part.get("inlineData")
+            if inline:
+                mime_type = inline.get("mimeType", "")
+                data = inline.get("data")
+                if data and mime_type.startswith("image/"):
+                    return b64decode(data), mime_type
+        
+        raise ValueError("No image data found in Gemini response")
+    
+    def generate_image_batch(
+        self,
+        prompt: str,
+        image_parts: List[Dict[str, Any]],
+        aspect_ratio: str,
+        count: int,
+        batch_variety: Optional[str] = None,
+        image_size: str = "4K",
+        system_prompt: Optional[str] = None,
+        on_image: Optional[Callable[[int, Tuple[bytes, str]], None]] = None
+    ) -> List[Tuple[bytes, str]]:
+        """
+        Generate a batch of images with a single Gemini request (candidateCount).
         
-        if not image_part or not image_part.get("inlineData") or not image_part["inlineData"].get("data"):
-            raise ValueError("No image data found in Gemini response")
+        Candidates of one request all share its prompt, so the batch request
+        carries one batch_variety note for the whole batch instead of a
+        variation per image. Images the request doesn't return, or the whole
+        batch when the model doesn't support candidateCount (remembered on the
+        client after the first rejection), are generated with per-index
+        generate_image calls in parallel, which do apply the per-image variations.
         
-        # Decode base64 image
-        base64_data = image_part["inlineData"]["data"]
-        mime_type = image_part["inlineData"]["mimeType"]
-        image_bytes = base64.b64decode(base64_data)
+        Args:
+            prompt: The text prompt for image generation
+            image_parts: List of image parts (from prepare_image_parts)
+            aspect_ratio: Target aspect ratio (e.g., "4:5", "9:16")
+            count: Number of images to generate
+            batch_variety: Type of variety ("subtle_variations" or "dynamic_angles")
+            image_size: Image resolution - "1K", "2K", or "4K" (default: "4K")
+            system_prompt: Fixed instructions sent as the systemInstruction, e.g. the
+                first half of prompt_builder.build_photoshoot_prompt_sections
+            on_image: Optional callback(index, image) called on the calling thread
+                as each image arrives, e.g. to report progress
         
-        return image_bytes, mime_type
+        Returns:
+            List of (image_bytes, mime_type) tuples in batch order, at most count
+            long. Images that fail in the fallback calls are left out.
+        """
+        results = {}
+        if count > 1 and self.candidate_count_supported:
+            for i, image in enumerate(self._generate_candidates(prompt, image_parts, aspect_ratio, count, batch_variety, image_size, system_prompt)):
+                results[i] = image
+                if on_image:
+                    on_image(i, image)
+        
+        # Top up with individual requests for any images the batch call did not return
+        missing = [i for i in range(count) if i not in results]
+        if missing:
+            with ThreadPoolExecutor(max_workers=min(len(missing), MAX_GENERATE_WORKERS)) as executor:
+                futures = {
+                    executor.submit(
+                        self.generate_image,
+                        prompt,
+                        image_parts,
+                        aspect_ratio,
+                        batch_index=i,
+                        batch_variety=batch_variety,
+                        image_size=image_size,
+                        system_prompt=system_prompt
+                    ): i
+                    for i in missing
+                }
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        results[i] = future.result()
+                    except Exception as e:
+                        print(f"Warning: Failed to generate image {i + 1}: {e}")
+                    else:
+                        if on_image:
+                            on_image(i, results[i])
+        
+        return [results[i] for i in sorted(results)]
+    
+    def _generate_candidates(
+        self,
+        prompt: str,
+        image_parts: List[Dict[str, Any]],
+        aspect_ratio: str,
+        count: int,
+        batch_variety: Optional[str] = None,
+        image_size: str = "4K",
+        system_prompt: Optional[str] = None
+    ) -> List[Tuple[bytes, str]]:
+        """
+        Request count images as candidates of one generateContent call.
+        
+        Clears candidate_count_supported when the model rejects candidateCount
+        (HTTP 400) or ignores it and returns a single candidate.
+        
+        Returns:
+            The images returned, at most count long; empty if the request failed
+        """
+        note = _BATCH_VARIETY_NOTES.get(batch_variety)
+        text = _CONSISTENCY_NOTE + " " + (note + " " if note else "") + prompt
+        request_body = {
+            "contents": [{
+                "role": "user",
+                "parts": [{"text": text}] + image_parts
+            }],
+            "generationConfig": {
+                "responseModalities": ["IMAGE"],
+                "candidateCount": count,
+                "imageConfig": {
+                    "aspectRatio": aspect_ratio,
+                    "imageSize": image_size
+                }
+            }
+        }
+        if system_prompt:
+            request_body["systemInstruction"] = _system_instruction(system_prompt)
+        
+        images = []
+        try:
+            response_data = self._post_generate(request_body)
+            candidates = response_data.get("candidates") or []
+            if len(candidates) == 1:
+                self.candidate_count_supported = False
+            for candidate in candidates:
+                try:
+                    images.append(self._extract_candidate_image(candidate))
+                except ValueError as e:
+                    print(f"Warning: Skipping batch candidate: {e}")
+        except requests.HTTPError as e:
+            if e.response is not None and e.response.status_code == 400:
+                self.candidate_count_supported = False
+            print(f"Warning: Batch request failed, generating images individually: {e}")
+        except (requests.RequestException, ValueError, KeyError) as e:
+            print(f"Warning: Batch request failed, generating images individually: {e}")
+        
+        return images[:count]
+    
+    def _create_async_client(self) -> httpx.AsyncClient:
+        """Create an HTTP/2 async client for concurrent generateContent calls"""
+        return httpx.AsyncClient(http2=True, timeout=300, limits=ASYNC_CLIENT_LIMITS)
+    
+    async def _post_generate_async(
+        self,
+        http_client: httpx.AsyncClient,
+        request_body: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Async counterpart of _post_generate"""
+        response = await http_client.post(
+            self.base_url,
+            headers=self._request_headers(),
+            content=_dumps(request_body)
+        )
+        
+        response.raise_for_status()
+        return _loads(response.content)
+    
+    async def generate_image_async(
+        self,
+        prompt: str,
+        image_parts: List[Dict[str, Any]],
+        aspect_ratio: str,
+        batch_index: Optional[int] = None,
+        batch_variety: Optional[str] = None,
+        image_size: str = "4K",
+        system_prompt: Optional[str] = None,
+        http_client: Optional[httpx.AsyncClient] = None
+    ) -> Tuple[bytes, str]:
+        """
+        Async version of generate_image
+        
+        Args:
+            prompt: The text prompt for image generation
+            image_parts: List of image parts (from prepare_image_parts)
+            aspect_ratio: Target aspect ratio (e.g., "4:5", "9:16")
+            batch_index: Index for batch generation (for variations)
+            batch_variety: Type of variety ("subtle_variations" or "dynamic_angles")
+            image_size: Image resolution - "1K", "2K", or "4K" (default: "4K")
+            system_prompt: Fixed instructions sent as the systemInstruction, e.g. the
+                first half of prompt_builder.build_photoshoot_prompt_sections
+            http_client: Shared async client; a temporary one is created if omitted
+        
+        Returns:
+            Tuple of (image_bytes, mime_type)
+        """
+        request_body = self._build_generate_request(
+            prompt,
+            image_parts,
+            aspect_ratio,
+            batch_index=batch_index,
+            batch_variety=batch_variety,
+            image_size=image_size,
+            system_prompt=system_prompt
+        )
+        
+        if http_client is None:
+            async with self._create_async_client() as client:
+                response_data = await self._post_generate_async(client, request_body)
+        else:
+            response_data = await self._post_generate_async(http_client, request_body)
+        
+        return self._extract_response_image(response_data)
+    
+    def submit(
+        self,
+        prompt: str,
+        image_parts: List[Dict[str, Any]],
+        aspect_ratio: str,
+        batch_index: Optional[int] = None,
+        batch_variety: Optional[str] = None,
+        image_size: str = "4K",
+        system_prompt: Optional[str] = None
+    ) -> asyncio.Future:
+        """
+        Queue a generate request on the running event loop's dispatcher.
+        
+        Requests submitted within BATCH_WINDOW_SECONDS of each other are dispatched
+        together (up to BATCH_WINDOW_SIZE at a time), with at most MAX_GENERATE_WORKERS
+        calls in flight across all windows.
+        
+        Args:
+            prompt: The text prompt for image generation
+            image_parts: List of image parts (from prepare_image_parts)
+            aspect_ratio: Target aspect ratio (e.g., "4:5", "9:16")
+            batch_index: Index for batch generation (for variations)
+            batch_variety: Type of variety ("subtle_variations" or "dynamic_angles")
+            image_size: Image resolution - "1K", "2K", or "4K" (default: "4K")
+            system_prompt: Fixed instructions sent as the systemInstruction, e.g. the
+                first half of prompt_builder.build_photoshoot_prompt_sections
+        
+        Returns:
+            Future resolving to (image_bytes, mime_type), or raising the request's error
+        """
+        loop = asyncio.get_running_loop()
+        key = id(loop)
+        dispatcher = self._dispatchers.get(key)
+        if dispatcher is None or dispatcher[1].done():
+            queue = asyncio.Queue()
+            task = loop.create_task(self._dispatcher(queue))
+            dispatcher = (queue, task)
+            self._dispatchers[key] = dispatcher
+            # Don't keep the queue, task (and through it the loop) once it has stopped
+            task.add_done_callback(lambda _, key=key, entry=dispatcher: self._drop_dispatcher(key, entry))
+        
+        future = loop.create_future()
+        dispatcher[0].put_nowait(
+            (future, (prompt, image_parts, aspect_ratio, batch_index, batch_variety, image_size, system_prompt))
+        )
+        return future
+    
+    def _drop_dispatcher(self, key: int, entry: Tuple[asyncio.Queue, asyncio.Task]) -> None:
+        """Forget a dispatcher, unless a newer one has already replaced it"""
+        if self._dispatchers.get(key) is entry:
+            del self._dispatchers[key]
+    
+    async def close_dispatcher(self) -> None:
+        """
+        Shut down the running event loop's submit() dispatcher.
+        
+        Requests already submitted still complete before this returns; a later
+        submit() starts a new dispatcher.
+        """
+        dispatcher = self._dispatchers.pop(id(asyncio.get_running_loop()), None)
+        if dispatcher is not None:
+            queue, task = dispatcher
+            queue.put_nowait(None)  # sentinel: stop after the queued requests
+            await asyncio.gather(task, return_exceptions=True)
+    
+    async def _dispatcher(self, queue: asyncio.Queue) -> None:
+        """Collect submitted requests into windows and run them concurrently until a None sentinel"""
+        loop = asyncio.get_running_loop()
+        sem = asyncio.Semaphore(MAX_GENERATE_WORKERS)
+        running = set()
+        
+        async with self._create_async_client() as http_client:
+            async def _run(future: asyncio.Future, args: Tuple) -> None:
+                async with sem:
+                    try:
+                        result = await self.generate_image_async(*args, http_client=http_client)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+            
+            closing = False
+            while not closing:
+                item = await queue.get()
+                if item is None:
+                    break
+                window = [item]
+                deadline = loop.time() + BATCH_WINDOW_SECONDS
+                while len(window) < BATCH_WINDOW_SIZE:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                    if item is None:
+                        closing = True
+                        break
+                    window.append(item)
+                
+                for future, args in window:
+                    task = loop.create_task(_run(future, args))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+            
+            # Let in-flight requests finish before the shared client closes
+            if running:
+                await asyncio.gather(*running)
+    
+    async def generate_batch_async(
+        self,
+        prompt: str,
+        image_parts: List[Dict[str, Any]],
+        aspect_ratio: str,
+        n: int,
+        batch_variety: Optional[str] = None,
+        image_size: str = "4K",
+        system_prompt: Optional[str] = None
+    ) -> List[Tuple[bytes, str]]:
+        """
+        Generate n variations concurrently through the submit() dispatcher.
+        
+        Each variation is a separate request (so batch_variety variations apply
+        per index); the dispatcher bounds how many are in flight at once and is
+        shut down once the batch finishes.
+        
+        Args:
+            prompt: The text prompt for image generation
+            image_parts: List of image parts (from prepare_image_parts)
+            aspect_ratio: Target aspect ratio (e.g., "4:5", "9:16")
+            n: Number of images to generate
+            batch_variety: Type of variety ("subtle_variations" or "dynamic_angles")
+            image_size: Image resolution - "1K", "2K", or "4K" (default: "4K")
+            system_prompt: Fixed instructions sent as the systemInstruction, e.g. the
+                first half of prompt_builder.build_photoshoot_prompt_sections
+        
+        Returns:
+            List of (image_bytes, mime_type) tuples in batch order. Images that
+            fail are left out.
+        """
+        futures = [
+            self.submit(
+                prompt,
+                image_parts,
+                aspect_ratio,
+                batch_index=i,
+                batch_variety=batch_variety,
+                image_size=image_size,
+                system_prompt=system_prompt
+            )
+            for i in range(n)
+        ]
+        try:
+            results = await asyncio.gather(*futures, return_exceptions=True)
+        finally:
+            await self.close_dispatcher()
+        
+        images = []
+        for i, result in enumerate(results):
+            if isinstance(result, BaseException):
+                print(f"Warning: Failed to generate image {i + 1}: {result}")
+            else:
+                images.append(result)
+        
+        return images
     
     def quick_fix_generate(
         self,
@@ -295,9 +896,11 @@ class GeminiPhotoshootClient:
         # Build parts: prompt first, then images
         parts = [{"text": prompt}]
         
-        # Add image parts
-        for image_url in image_urls[:14]:  # Limit to 14 images
-            self._add_image_part(parts, image_url)
+        # Add image parts, fetched in parallel
+        image_urls = [image_url for image_url in image_urls[:14] if image_url]  # Limit to 14 images
+        if image_urls:
+            with ThreadPoolExecutor(max_workers=min(len(image_urls), MAX_FETCH_WORKERS)) as executor:
+                parts.extend(part for part in executor.map(self._fetch_image_part, image_urls) if part)
         
         # Handle aspect ratio
         final_aspect_ratio = aspect_ratio
@@ -321,41 +924,5 @@ class GeminiPhotoshootClient:
             }
         }
         
-        # Call Gemini API
-        response = requests.post(
-            self.base_url,
-            headers={
-                "Content-Type": "application/json",
-                "x-goog-api-key": self.api_key
-            },
-            json=request_body,
-            timeout=300
-        )
-        
-        response.raise_for_status()
-        response_data = response.json()
-        
-        # Extract image from response
-        if not response_data.get("candidates") or not response_data["candidates"][0]:
-            raise ValueError("Invalid response format: no candidates found")
-        
-        candidate = response_data["candidates"][0]
-        if not candidate.get("content") or not candidate["content"].get("parts"):
-            raise ValueError("Invalid response format: no content parts found")
-        
-        # Find image part
-        image_part = None
-        for part in candidate["content"]["parts"]:
-            if part.get("inlineData") and part["inlineData"].get("mimeType", "").startswith("image/"):
-                image_part = part
-                break
-        
-        if not image_part or not image_part.get("inlineData") or not image_part["inlineData"].get("data"):
-            raise ValueError("No image data found in Gemini response")
-        
-        # Decode base64 image
-        base64_data = image_part["inlineData"]["data"]
-        mime_type = image_part["inlineData"]["mimeType"]
-        image_bytes = base64.b64decode(base64_data)
-        
-        return image_bytes, mime_type
+        # Call Gemini API and extract the image from the response
+        return self._post_generate_image(request_body)
@@ -1,10 +1,31 @@
 import base64
+import io
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 import os
-from datetime import datetime
-import uuid
-from typing import Dict, Optional
+import threading
+import time
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import MappingProxyType
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple, Union
+from PIL import Image
+
+# pybase64 has the same API as the stdlib module but uses SIMD kernels
+try:
+    import pybase64 as _base64
+except ImportError:
+    _base64 = base64
+
+# cachetools lets cached reference images expire; without it url_to_base64 falls back to lru_cache
+try:
+    from cachetools import TTLCache, cached
+except ImportError:
+    TTLCache = None
 
 # Valid image type categories for uploads
 IMAGE_TYPES = {
@@ -51,6 +72,117 @@ IMAGE_TYPES = {
     "quick_fix": "Quick Fix reference images"
 }
 
+# Folder category for each image type (built once at import)
+_FOLDER_MAP = MappingProxyType({
+    # Model
+    "model_ref": "model-refs",
+    "model": "model-refs",
+    
+    # Outfit
+    "outfit": "outfit-refs",
+    "primary": "outfit-refs",
+    
+    # Items
+    "item": "item-refs",
+    "jacket": "item-refs",
+    "shoes": "item-refs",
+    "bag": "item-refs",
+    "hat": "item-refs",
+    "scarf": "item-refs",
+    "belt": "item-refs",
+    "sunglasses": "item-refs",
+    "watch": "item-refs",
+    "new_item": "item-refs",
+    
+    # Jewelry
+    "jewelry_neck": "jewelry-refs",
+    "jewelry_ears": "jewelry-refs",
+    "jewelry_hands": "jewelry-refs",
+    "neck": "jewelry-refs",
+    "ears": "jewelry-refs",
+    "hands": "jewelry-refs",
+    
+    # Environment
+    "background": "environment-refs",
+    "environment": "environment-refs",
+    
+    # Photography
+    "pose": "pose-refs",
+    "hair": "hair-refs",
+    
+    # Legacy
+    "accessory": "accessory-refs",
+    
+    # Quick Fix
+    "quick_fix": "quick-fix-refs"
+})
+
+# Content type for each accepted reference image extension
+_CONTENT_TYPE_MAP = MappingProxyType({
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'gif': 'image/gif'
+})
+_VALID_EXT = frozenset(_CONTENT_TYPE_MAP)
+
+# File extension for each generated image MIME type
+_EXT_MAP = MappingProxyType({
+    'image/jpeg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'image/gif': 'gif'
+})
+
+def create_http_session() -> requests.Session:
+    """
+    Create a requests Session with keep-alive connection pooling and retries.
+    
+    Reusing one session avoids a new TCP+TLS handshake for every image fetch
+    and Gemini call. Transient 429/5xx responses are retried with backoff.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=32,
+        max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+# Shared session for reference image fetches
+_SESSION = create_http_session()
+
+# Largest reference image accepted by presigned browser uploads (25 MiB)
+MAX_DIRECT_UPLOAD_BYTES = 25 * 1024 * 1024
+
+# Connection pool sized for parallel batch uploads, with keep-alive and adaptive retries
+S3_CLIENT_CONFIG = Config(
+    max_pool_connections=32,
+    tcp_keepalive=True,
+    retries={'max_attempts': 3, 'mode': 'adaptive'}
+)
+
+# Multipart settings for streamed uploads - peak memory stays around one 8 MiB part
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+STREAM_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=MULTIPART_CHUNK_SIZE,
+    multipart_chunksize=MULTIPART_CHUNK_SIZE,
+    use_threads=True,
+    max_concurrency=4
+)
+
+# Maximum number of generated images uploaded concurrently by upload_many
+MAX_UPLOAD_WORKERS = 8
+
+
+def _key_stamp() -> Tuple[int, str]:
+    """Return (millisecond timestamp, 8-hex-char random ID) for building unique S3 keys"""
+    return time.time_ns() // 1_000_000, os.urandom(4).hex()
+
 
 class S3ImageHandler:
     def __init__(self):
@@ -58,71 +190,30 @@ class S3ImageHandler:
             's3',
             aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
             aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-            region_name=os.getenv('AWS_REGION', 'eu-north-1')
+            region_name=os.getenv('AWS_REGION', 'eu-north-1'),
+            config=S3_CLIENT_CONFIG
         )
         self.bucket_name = os.getenv('S3_BUCKET_NAME', 'crowai-image-bucket')
         self.cloudfront_domain = os.getenv('CLOUDFRONT_DOMAIN')
+        
+        # Public URL prefix, resolved once instead of on every upload
+        if self.cloudfront_domain:
+            self._url_prefix = f"https://{self.cloudfront_domain}/"
+        else:
+            region = os.getenv('AWS_REGION', 'eu-north-1')
+            self._url_prefix = f"https://{self.bucket_name}.s3.{region}.amazonaws.com/"
     
     def get_public_url(self, key: str) -> str:
         """Get public URL for S3 object"""
-        clean_key = key.lstrip('/')
-        if self.cloudfront_domain:
-            return f"https://{self.cloudfront_domain}/{clean_key}"
-        region = os.getenv('AWS_REGION', 'eu-north-1')
-        return f"https://{self.bucket_name}.s3.{region}.amazonaws.com/{clean_key}"
+        return self._url_prefix + key.lstrip('/')
     
     def _get_category_folder(self, image_type: str) -> str:
         """Get the subfolder for an image type category"""
-        # Map image types to folder categories
-        folder_map = {
-            # Model
-            "model_ref": "model-refs",
-            "model": "model-refs",
-            
-            # Outfit
-            "outfit": "outfit-refs",
-            "primary": "outfit-refs",
-            
-            # Items
-            "item": "item-refs",
-            "jacket": "item-refs",
-            "shoes": "item-refs",
-            "bag": "item-refs",
-            "hat": "item-refs",
-            "scarf": "item-refs",
-            "belt": "item-refs",
-            "sunglasses": "item-refs",
-            "watch": "item-refs",
-            "new_item": "item-refs",
-            
-            # Jewelry
-            "jewelry_neck": "jewelry-refs",
-            "jewelry_ears": "jewelry-refs",
-            "jewelry_hands": "jewelry-refs",
-            "neck": "jewelry-refs",
-            "ears": "jewelry-refs",
-            "hands": "jewelry-refs",
-            
-            # Environment
-            "background": "environment-refs",
-            "environment": "environment-refs",
-            
-            # Photography
-            "pose": "pose-refs",
-            "hair": "hair-refs",
-            
-            # Legacy
-            "accessory": "accessory-refs",
-            
-            # Quick Fix
-            "quick_fix": "quick-fix-refs"
-        }
-        
-        return folder_map.get(image_type, "photoshoot-refs")
+        return _FOLDER_MAP.get(image_type, "photoshoot-refs")
     
     def upload_reference_image(
         self,
-        image_bytes: bytes,
+        image_file: Union[bytes, BinaryIO],
         filename: str,
         image_type: str = "primary"
     ) -> Dict[str, str]:
@@ -133,8 +224,11 @@ class S3ImageHandler:
         
         Path format: generated-images/{category-folder}/photoshoot_{type}_{timestamp}_{randomId}.{ext}
         
+        File-like objects are streamed with S3 multipart upload, so large files
+        are sent in MULTIPART_CHUNK_SIZE parts without reading them into memory.
+        
         Args:
-            image_bytes: The image data as bytes
+            image_file: Readable binary file-like object (or raw bytes) with the image data
             filename: Original filename (used for extension)
             image_type: Type of image (see IMAGE_TYPES for valid types)
         
@@ -143,12 +237,11 @@ class S3ImageHandler:
         """
         try:
             # Generate unique filename
-            timestamp = int(datetime.now().timestamp() * 1000)
-            random_id = str(uuid.uuid4()).split('-')[0]
+            timestamp, random_id = _key_stamp()
             file_extension = filename.split('.')[-1].lower() if '.' in filename else 'jpg'
             
             # Validate extension
-            if file_extension not in ['jpg', 'jpeg', 'png', 'webp', 'gif']:
+            if file_extension not in _VALID_EXT:
                 file_extension = 'jpg'
             
             # Get category folder
@@ -160,22 +253,21 @@ class S3ImageHandler:
             s3_key = f"generated-images/{file_path}"
             
             # Determine content type
-            content_type_map = {
-                'jpg': 'image/jpeg',
-                'jpeg': 'image/jpeg',
-                'png': 'image/png',
-                'webp': 'image/webp',
-                'gif': 'image/gif'
-            }
-            content_type = content_type_map.get(file_extension, 'image/jpeg')
+            content_type = _CONTENT_TYPE_MAP.get(file_extension, 'image/jpeg')
+            
+            if isinstance(image_file, (bytes, bytearray)):
+                image_file = io.BytesIO(image_file)
             
             # Upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=image_bytes,
-                ContentType=content_type,
-                CacheControl='max-age=3600'
+            self.s3_client.upload_fileobj(
+                image_file,
+                self.bucket_name,
+                s3_key,
+                ExtraArgs={
+                    'ContentType': content_type,
+                    'CacheControl': 'max-age=3600'
+                },
+                Config=STREAM_TRANSFER_CONFIG
             )
             
             # Get public URL
@@ -212,37 +304,46 @@ class S3ImageHandler:
             mime_type: MIME type of the image
             job_id: Optional job ID for grouping (uses timestamp if not provided)
         
+        Returns:
+            Dict with 'success', 'public_url', 's3_key', and optionally 'error'
+        """
+        # upload_fileobj switches to threaded multipart for large images
+        return self.upload_generated_image_stream(io.BytesIO(image_bytes), mime_type, job_id)
+    
+    def upload_generated_image_stream(
+        self,
+        fileobj: BinaryIO,
+        mime_type: str = "image/png",
+        job_id: Optional[str] = None
+    ) -> Dict[str, str]:
+        """
+        Upload generated image to S3 from a file-like object.
+        
+        Uses S3 multipart upload for large images so the data is sent in
+        MULTIPART_CHUNK_SIZE parts instead of one buffered request.
+        Same path format and return value as upload_generated_image.
+        
+        Args:
+            fileobj: Readable binary file-like object with the image data
+            mime_type: MIME type of the image
+            job_id: Optional job ID for grouping (uses timestamp if not provided)
+        
         Returns:
             Dict with 'success', 'public_url', 's3_key', and optionally 'error'
         """
         try:
-            timestamp = int(datetime.now().timestamp() * 1000)
-            random_id = str(uuid.uuid4()).split('-')[0]
-            
-            # Use job_id or timestamp for folder grouping
-            folder_id = job_id if job_id else str(timestamp)
-            
-            # Determine file extension from MIME type
-            ext_map = {
-                'image/jpeg': 'jpg',
-                'image/png': 'png',
-                'image/webp': 'webp',
-                'image/gif': 'gif'
-            }
-            file_ext = ext_map.get(mime_type, 'png')
-            
-            # Build filename and path
-            s3_filename = f"photoshoot_{timestamp}_{random_id}.{file_ext}"
-            folder_path = f"model-photoshoots/{folder_id}/{s3_filename}"
-            s3_key = f"generated-images/{folder_path}"
+            s3_key = self._generated_image_key(mime_type, job_id)
             
             # Upload to S3
-            self.s3_client.put_object(
-                Bucket=self.bucket_name,
-                Key=s3_key,
-                Body=image_bytes,
-                ContentType=mime_type,
-                CacheControl='max-age=3600'
+            self.s3_client.upload_fileobj(
+                fileobj,
+                self.bucket_name,
+                s3_key,
+                ExtraArgs={
+                    'ContentType': mime_type,
+                    'CacheControl': 'max-age=3600'
+                },
+                Config=STREAM_TRANSFER_CONFIG
             )
             
             # Get public URL
@@ -262,6 +363,118 @@ class S3ImageHandler:
                 'error': str(e)
             }
     
+    def upload_many(
+        self,
+        images: List[Tuple[bytes, str, Optional[str]]],
+        on_complete: Optional[Callable[[int, Dict[str, str]], None]] = None
+    ) -> List[Dict[str, str]]:
+        """
+        Upload several generated images concurrently.
+        
+        Each image goes through upload_generated_image_stream on a thread pool
+        that shares this handler's pooled S3 client.
+        
+        Args:
+            images: List of (image_bytes, mime_type, job_id) tuples
+            on_complete: Optional callback(index, result) called as each upload
+                finishes. It runs on the calling thread, so it may update UI state.
+        
+        Returns:
+            List of upload result dicts (see upload_generated_image), in input order
+        """
+        if not images:
+            return []
+        
+        results: List[Optional[Dict[str, str]]] = [None] * len(images)
+        with ThreadPoolExecutor(max_workers=min(len(images), MAX_UPLOAD_WORKERS)) as executor:
+            futures = {
+                executor.submit(
+                    self.upload_generated_image_stream,
+                    io.BytesIO(image_bytes),
+                    mime_type,
+                    job_id
+                ): i
+                for i, (image_bytes, mime_type, job_id) in enumerate(images)
+            }
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = future.result()
+                if on_complete:
+                    on_complete(i, results[i])
+        
+        return results
+    
+    def _generated_image_key(self, mime_type: str, job_id: Optional[str] = None) -> str:
+        """Build the S3 key for a generated image"""
+        timestamp, random_id = _key_stamp()
+        
+        # Use job_id or timestamp for folder grouping
+        folder_id = job_id if job_id else str(timestamp)
+        
+        # Determine file extension from MIME type
+        file_ext = _EXT_MAP.get(mime_type, 'png')
+        
+        # Build filename and path
+        s3_filename = f"photoshoot_{timestamp}_{random_id}.{file_ext}"
+        folder_path = f"model-photoshoots/{folder_id}/{s3_filename}"
+        return f"generated-images/{folder_path}"
+    
+    def create_presigned_post(
+        self,
+        image_type: str = "primary",
+        expires_in: int = 300
+    ) -> Dict[str, Any]:
+        """
+        Create a presigned POST so the browser can upload a reference image directly to S3.
+        
+        The key ends in S3's ${filename} variable, which S3 replaces with the uploaded
+        file's name. The caller does the same substitution on 'public_url'.
+        
+        Path format: generated-images/{category-folder}/photoshoot_{type}_{timestamp}_{randomId}_${filename}
+        
+        Args:
+            image_type: Type of image (see IMAGE_TYPES for valid types)
+            expires_in: Seconds until the presigned POST expires
+        
+        Returns:
+            Dict with 'success', 'url', 'fields', 's3_key', 'public_url', 'expires_at', and optionally 'error'
+        """
+        try:
+            timestamp, random_id = _key_stamp()
+            category_folder = self._get_category_folder(image_type)
+            s3_key = f"generated-images/{category_folder}/photoshoot_{image_type}_{timestamp}_{random_id}_${{filename}}"
+            
+            presigned = self.s3_client.generate_presigned_post(
+                Bucket=self.bucket_name,
+                Key=s3_key,
+                Fields={'Cache-Control': 'max-age=3600'},
+                Conditions=[
+                    {'Cache-Control': 'max-age=3600'},
+                    ['starts-with', '$Content-Type', 'image/'],
+                    ['content-length-range', 1, MAX_DIRECT_UPLOAD_BYTES]
+                ],
+                ExpiresIn=expires_in
+            )
+            
+            return {
+                'success': True,
+                'url': presigned['url'],
+                'fields': presigned['fields'],
+                's3_key': s3_key,
+                'public_url': self.get_public_url(s3_key),
+                'expires_at': timestamp // 1000 + expires_in
+            }
+            
+        except Exception as e:
+            return {
+                'success': False,
+                'url': '',
+                'fields': {},
+                's3_key': '',
+                'public_url': '',
+                'error': str(e)
+            }
+    
     def delete_image(self, s3_key: str) -> Dict[str, bool]:
         """
         Delete an image from S3.
@@ -285,10 +498,44 @@ class S3ImageHandler:
             }
 
 
+def b64decode(data: Union[str, bytes]) -> bytes:
+    """Decode base64 data (e.g. Gemini inlineData) with the fastest available decoder"""
+    return _base64.b64decode(data, validate=False)
+
+
+# Chunk size for streamed fetches - a multiple of 3 so each chunk encodes without padding
+BASE64_CHUNK_SIZE = 57 * 1024
+
+
+# url_to_base64 keeps up to this many encoded references, each for up to
+# REFERENCE_CACHE_TTL seconds (when cachetools is installed)
+REFERENCE_CACHE_SIZE = 64
+REFERENCE_CACHE_TTL = 3600
+
+
+def _reference_cache(func: Callable[[str], str]) -> Callable[[str], str]:
+    """Cache func per URL in a TTLCache, or in an lru_cache when cachetools is missing"""
+    if TTLCache is None:
+        return lru_cache(maxsize=REFERENCE_CACHE_SIZE)(func)
+    return cached(TTLCache(REFERENCE_CACHE_SIZE, REFERENCE_CACHE_TTL), lock=threading.Lock())(func)
+
+
+@_reference_cache
 def url_to_base64(image_url: str) -> str:
     """
     Fetch image from URL and convert to base64.
     
+    Results are cached per URL in one process-wide cache shared by all
+    sessions, holding at most REFERENCE_CACHE_SIZE images. Uploaded reference
+    URLs embed a timestamp and random ID, so the same URL always refers to the
+    same image. With cachetools installed, entries expire after
+    REFERENCE_CACHE_TTL seconds. Without it, entries never expire while the
+    process runs and are only evicted when the cache is full. Failed fetches
+    are not cached.
+    
+    The response is streamed and encoded chunk by chunk, so the full raw image
+    and its encoded copy are never held in memory at the same time.
+    
     Args:
         image_url: The URL of the image to fetch
     
@@ -298,9 +545,39 @@ def url_to_base64(image_url: str) -> str:
     Raises:
         requests.RequestException: If the image cannot be fetched
     """
-    response = requests.get(image_url, timeout=30)
-    response.raise_for_status()
-    return base64.b64encode(response.content).decode('utf-8')
+    with _SESSION.get(image_url, timeout=30, stream=True) as response:
+        response.raise_for_status()
+        encoded = bytearray()
+        pending = b""
+        for chunk in response.iter_content(chunk_size=BASE64_CHUNK_SIZE):
+            pending += chunk
+            # Only encode whole 3-byte groups; carry the remainder into the next chunk
+            usable = len(pending) - len(pending) % 3
+            if usable:
+                encoded += _base64.b64encode(pending[:usable])
+                pending = pending[usable:]
+        encoded += _base64.b64encode(pending)
+    return encoded.decode('ascii')
+
+
+def make_thumbnail(image_bytes: bytes, size: Tuple[int, int] = (512, 512)) -> bytes:
+    """
+    Create a downscaled JPEG thumbnail for display.
+    
+    Args:
+        image_bytes: The full-resolution image data
+        size: Maximum (width, height) of the thumbnail
+    
+    Returns:
+        JPEG encoded thumbnail bytes
+    """
+    image = Image.open(io.BytesIO(image_bytes))
+    image.thumbnail(size, Image.Resampling.LANCZOS)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
 
 
 def get_image_mime_type(filename: str) -> str:
@@ -314,11 +591,4 @@ def get_image_mime_type(filename: str) -> str:
         MIME type string
     """
     ext = filename.split('.')[-1].lower() if '.' in filename else 'jpg'
-    mime_map = {
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg',
-        'png': 'image/png',
-        'webp': 'image/webp',
-        'gif': 'image/gif'
-    }
-    return mime_map.get(ext, 'image/jpeg')
+    return _CONTENT_TYPE_MAP.get(ext, 'image/jpeg')
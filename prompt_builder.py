@@ -1,217 +1,299 @@
-from typing import Dict, Any, List
+"""
+Prompt construction for the photoshoot generator.
+
+Everything here is small-dict lookups and string formatting, a few dozen
+operations per prompt - keep it plain Python. JIT/compiled approaches (Numba,
+Cython) target numeric array loops and their call overhead would exceed the
+work done here. Speed-ups belong in C-level str primitives (str.join,
+str.format, str.translate, sys.intern), module-level constants, and the
+prompt cache in build_photoshoot_prompt.
+"""
+import json
+import sys
+from functools import lru_cache
+from itertools import chain
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, List, Mapping, Tuple
+
+from schemas import Environment, Item, Jewelry, ModelRef, Outfit, Photography, items_from_list
+
+# msgpack packs the prompt cache key several times faster than json.dumps
+try:
+    import msgpack
+    _pack_key = msgpack.packb
+
+    def _unpack_key(key: bytes) -> Any:
+        # Configs may hold non-str mapping keys (e.g. ints) that packed fine
+        return msgpack.unpackb(key, strict_map_key=False)
+except ImportError:
+    def _pack_key(obj: Any) -> bytes:
+        return json.dumps(obj).encode("utf-8")
+    _unpack_key = json.loads
+
+# Shared read-only default for builders called without an image_mapping
+_EMPTY_MAPPING: Mapping[str, str] = MappingProxyType({})
+
+# Quality enhancement tail appended to every prompt
+_QUALITY_BOOST = sys.intern(
+    "realistic head to body ratio, ultra-detailed, highly realistic, "
+    "professional photography, 8k uhd, cinematic lighting, soft natural light, "
+    "sharp focus, perfect skin texture, lifelike eyes, accurate facial proportions, "
+    "volumetric depth, subtle shadows, realistic skin tones, detailed hair strands, "
+    "fine pores, depth of field, masterpiece, award-winning portrait style"
+)
+
+# Long instruction templates. {ref} is the image label from image_mapping.
+_TMPL_MODEL_KEEP = "CRITICAL: Extract and use the EXACT same face from {ref}. The face features (eyes, nose, mouth, facial structure, skin tone, facial proportions) must match exactly. Also extract the body figure and proportions from {ref}. IGNORE the background, clothing, outfit, accessories, and any other elements from the model reference image."
+_MODEL_KEEP_GENERIC = sys.intern("CRITICAL: Extract and use the EXACT same face from the model reference image. The face features must match exactly. Also extract the body figure and proportions. IGNORE the background, clothing, outfit, accessories, and any other elements.")
+_MODEL_REF_ONLY_NOTE = sys.intern("IMPORTANT: The model reference image should ONLY be used to extract the face and body figure. Do not use any other elements from that image.")
+_TMPL_OUTFIT = "CRITICAL REQUIREMENT: Extract ONLY the clothing/outfit from {ref}. IGNORE any person, model, face, body, or background in {ref}. If there is a person wearing the outfit in {ref}, extract ONLY the clothing items (shirt, dress, pants, jacket, etc.) and completely ignore the person. REPLACE the model's clothing with ONLY the extracted outfit from {ref}. Maintain the clothing design, texture, color, and details from the extracted outfit."
+_TMPL_ENVIRONMENT = "CRITICAL: Extract ONLY the background/environment/scene from {ref}. IGNORE any person, model, face, body, clothing, or foreground elements. Use ONLY the background, environment setting, and scene from {ref}."
+_TMPL_POSE = "CRITICAL: Extract ONLY the body pose, positioning, and stance from {ref}. IGNORE the face, clothing, outfit, background, and other elements. Use ONLY the body positioning and pose from {ref} with {similarity}% similarity."
+_TMPL_HAIR = "CRITICAL: Extract ONLY the hairstyle, hair texture, and hair styling from {ref}. IGNORE the face features, body, clothing, background, and other elements. Use ONLY the hairstyle and hair appearance from {ref}."
+
+# Fully substituted forms for when image_mapping has no label for the image
+_OUTFIT_DEFAULT = sys.intern(_TMPL_OUTFIT.format(ref="the outfit reference image"))
+_ENVIRONMENT_DEFAULT = sys.intern(_TMPL_ENVIRONMENT.format(ref="the background/environment reference image"))
+_HAIR_DEFAULT = sys.intern(_TMPL_HAIR.format(ref="the hairstyle reference image"))
+
+# Added when more than one image is generated from the same prompt
+_BATCH_CONSISTENCY = sys.intern("CRITICAL CONSISTENCY REQUIREMENT: When generating multiple images, the model's face, body figure, outfit, all clothing items, jewelry, and accessories must remain EXACTLY THE SAME across all generated images. Only camera angles, poses, lighting variations, and composition can differ between images. All core elements must be identical.")
+
+# %-format strings for single-substitution prompt lines
+_FMT_MODEL_APPEARANCE = sys.intern("Model appearance: %s.")
+_FMT_NEW_MODEL = sys.intern("Generate a new model with the following characteristics: %s.")
+_FMT_OUTFIT = sys.intern("Outfit: %s.")
+_FMT_ADDITIONAL_ITEMS = sys.intern("Additional items: %s.")
+_FMT_JEWELRY = sys.intern("Jewelry and accessories: %s.")
+_FMT_ENVIRONMENT = sys.intern("Environment: %s.")
+_FMT_BACKGROUND_DETAILS = sys.intern("Background details: %s.")
+_FMT_PHOTOGRAPHY = sys.intern("Photography style: %s.")
+_FMT_SHADOWS = sys.intern("Shadows: %s.")
+_FMT_POSE = sys.intern("Pose: %s.")
+_FMT_HAIR = sys.intern("Hair styling: %s.")
+
+# Gemini aspect ratio for each platform preset
+_ASPECT_RATIO_MAP = MappingProxyType({
+    "instagram_portrait": "4:5",
+    "instagram_story": "9:16",
+    "instagram_square": "1:1",
+    "default": "2:3"
+})
+_DEFAULT_ASPECT_RATIO = _ASPECT_RATIO_MAP["default"]
+
 
 def map_platform_preset_to_aspect_ratio(platform_preset: str) -> str:
     """Map platform preset to Gemini aspect ratio"""
-    mapping = {
-        "instagram_portrait": "4:5",
-        "instagram_story": "9:16",
-        "instagram_square": "1:1",
-        "default": "2:3"
-    }
-    return mapping.get(platform_preset, mapping["default"])
+    return _ASPECT_RATIO_MAP.get(platform_preset, _DEFAULT_ASPECT_RATIO)
 
 
-def build_model_reference_prompt(model_ref: Dict[str, Any], image_mapping: Dict[str, str] = None) -> List[str]:
+def build_model_reference_prompt(model_ref: ModelRef, image_mapping: Dict[str, str] = None) -> List[str]:
     """Build prompt parts for model reference"""
     parts = []
-    image_mapping = image_mapping or {}
+    image_mapping = image_mapping or _EMPTY_MAPPING
     
     # Handle text description
-    if model_ref.get("text_description"):
-        parts.append(f"Model appearance: {model_ref['text_description']}.")
+    text_description = model_ref.text_description
+    if text_description:
+        parts.append(_FMT_MODEL_APPEARANCE % text_description)
     
     # Handle face action
-    face_action = model_ref.get("face_action", "keep")
+    has_image = bool(model_ref.image_url)
+    face_action = model_ref.face_action
     if face_action == "keep":
-        if model_ref.get("image_url") and "model_ref" in image_mapping:
-            parts.append(f"CRITICAL: Extract and use the EXACT same face from {image_mapping['model_ref']}. The face features (eyes, nose, mouth, facial structure, skin tone, facial proportions) must match exactly. Also extract the body figure and proportions from {image_mapping['model_ref']}. IGNORE the background, clothing, outfit, accessories, and any other elements from the model reference image.")
+        model_ref_label = image_mapping.get("model_ref") if has_image else None
+        if model_ref_label is not None:
+            parts.append(_TMPL_MODEL_KEEP.format(ref=model_ref_label))
         else:
-            parts.append("CRITICAL: Extract and use the EXACT same face from the model reference image. The face features must match exactly. Also extract the body figure and proportions. IGNORE the background, clothing, outfit, accessories, and any other elements.")
+            parts.append(_MODEL_KEEP_GENERIC)
     elif face_action == "generate":
-        if model_ref.get("new_model_description"):
-            parts.append(f"Generate a new model with the following characteristics: {model_ref['new_model_description']}.")
+        new_model_description = model_ref.new_model_description
+        if new_model_description:
+            parts.append(_FMT_NEW_MODEL % new_model_description)
         else:
             parts.append("Generate a new model face.")
     
     # Always add instruction to use only model face and figure from model reference
-    if model_ref.get("image_url") and face_action == "keep":
-        parts.append("IMPORTANT: The model reference image should ONLY be used to extract the face and body figure. Do not use any other elements from that image.")
+    if has_image and face_action == "keep":
+        parts.append(_MODEL_REF_ONLY_NOTE)
     
     return parts
 
 
-def build_outfit_prompt(outfit: Dict[str, Any], image_mapping: Dict[str, str] = None) -> List[str]:
+def build_outfit_prompt(outfit: Outfit, image_mapping: Dict[str, str] = None) -> List[str]:
     """Build prompt parts for base outfit"""
     parts = []
-    image_mapping = image_mapping or {}
+    image_mapping = image_mapping or _EMPTY_MAPPING
+    
+    text_description = outfit.text_description
     
     # Clothing instruction - IMPORTANT: Outfit image REPLACES model's clothing
-    if outfit.get("image_url"):
-        outfit_ref = image_mapping.get("outfit", "the outfit reference image")
-        parts.append(f"CRITICAL REQUIREMENT: Extract ONLY the clothing/outfit from {outfit_ref}. IGNORE any person, model, face, body, or background in {outfit_ref}. If there is a person wearing the outfit in {outfit_ref}, extract ONLY the clothing items (shirt, dress, pants, jacket, etc.) and completely ignore the person. REPLACE the model's clothing with ONLY the extracted outfit from {outfit_ref}. Maintain the clothing design, texture, color, and details from the extracted outfit.")
-    elif outfit.get("text_description"):
+    if outfit.image_url:
+        outfit_label = image_mapping.get("outfit")
+        if outfit_label is not None:
+            parts.append(_TMPL_OUTFIT.format(ref=outfit_label))
+        else:
+            parts.append(_OUTFIT_DEFAULT)
+    elif text_description:
         parts.append("Apply the following outfit as described.")
     
     # Text description
-    if outfit.get("text_description"):
-        parts.append(f"Outfit: {outfit['text_description']}.")
+    if text_description:
+        parts.append(_FMT_OUTFIT % text_description)
     
     return parts
 
 
-def build_additional_items_prompt(items: List[Dict[str, Any]], image_mapping: Dict[str, str] = None) -> List[str]:
+def build_additional_items_prompt(items: Tuple[Item, ...], image_mapping: Dict[str, str] = None) -> List[str]:
     """Build prompt parts for additional clothing items"""
     parts = []
-    image_mapping = image_mapping or {}
+    image_mapping = image_mapping or _EMPTY_MAPPING
     
     if not items:
         return parts
     
     item_descriptions = []
+    add_description = item_descriptions.append  # bound once for the loop
     for idx, item in enumerate(items):
-        item_type = item.get("type", "item")
+        item_type = item.type
+        text = item.text
         
-        if item.get("text"):
-            item_descriptions.append(f"{item_type}: {item['text']}")
-        elif item.get("image_url"):
+        if text:
+            add_description(f"{item_type}: {text}")
+        elif item.image_url:
             item_ref = image_mapping.get(f"item_{idx}", f"the {item_type} reference image")
-            item_descriptions.append(f"{item_type}: extract ONLY the {item_type} from {item_ref}, ignore any person/background/other elements")
+            add_description(f"{item_type}: extract ONLY the {item_type} from {item_ref}, ignore any person/background/other elements")
     
     if item_descriptions:
-        parts.append(f"Additional items: {'; '.join(item_descriptions)}.")
+        parts.append(_FMT_ADDITIONAL_ITEMS % "; ".join(item_descriptions))
     
     return parts
 
 
-def build_jewelry_prompt(jewelry: Dict[str, Any], image_mapping: Dict[str, str] = None) -> List[str]:
+# Jewelry slots as (Jewelry attribute / config key, prompt label, image_mapping key, default image ref, area to apply to)
+_JEWELRY_SLOTS = (
+    ("neck", "neck", "jewelry_neck", "the neck jewelry reference image", "neck area"),
+    ("ears", "ears", "jewelry_ears", "the ear jewelry reference image", "ears"),
+    ("hands_wrists", "hands/wrists", "jewelry_hands", "the hand/wrist jewelry reference image", "hands and wrists"),
+)
+
+
+def build_jewelry_prompt(jewelry: Jewelry, image_mapping: Dict[str, str] = None) -> List[str]:
     """Build prompt parts for jewelry configuration"""
     parts = []
     jewelry_items = []
-    image_mapping = image_mapping or {}
-    
-    # Neck jewelry
-    neck = jewelry.get("neck", {})
-    if neck.get("enabled"):
-        method = neck.get("method", "none")
-        if method == "text_description" and neck.get("text"):
-            jewelry_items.append(f"neck: {neck['text']}")
-        elif method == "image_reference":
-            neck_ref = image_mapping.get("jewelry_neck", "the neck jewelry reference image")
-            jewelry_items.append(f"neck: extract ONLY the jewelry from {neck_ref}, ignore any person/background/other elements, apply to neck area")
-        elif method == "text_and_image" and neck.get("text"):
-            neck_ref = image_mapping.get("jewelry_neck", "the neck jewelry reference image")
-            jewelry_items.append(f"neck: {neck['text']} (extract jewelry from {neck_ref}, ignore person/background)")
-    
-    # Ear jewelry
-    ears = jewelry.get("ears", {})
-    if ears.get("enabled"):
-        method = ears.get("method", "none")
-        if method == "text_description" and ears.get("text"):
-            jewelry_items.append(f"ears: {ears['text']}")
+    add_item = jewelry_items.append  # bound once for the loop
+    image_mapping = image_mapping or _EMPTY_MAPPING
+    
+    for key, label, mapping_key, default_ref, apply_to in _JEWELRY_SLOTS:
+        slot = getattr(jewelry, key)
+        if not slot.enabled:
+            continue
+        method = slot.method
+        text = slot.text
+        if method == "text_description" and text:
+            add_item(f"{label}: {text}")
         elif method == "image_reference":
-            ears_ref = image_mapping.get("jewelry_ears", "the ear jewelry reference image")
-            jewelry_items.append(f"ears: extract ONLY the jewelry from {ears_ref}, ignore any person/background/other elements, apply to ears")
-        elif method == "text_and_image" and ears.get("text"):
-            ears_ref = image_mapping.get("jewelry_ears", "the ear jewelry reference image")
-            jewelry_items.append(f"ears: {ears['text']} (extract jewelry from {ears_ref}, ignore person/background)")
-    
-    # Hands/wrists jewelry
-    hands = jewelry.get("hands_wrists", {})
-    if hands.get("enabled"):
-        method = hands.get("method", "none")
-        if method == "text_description" and hands.get("text"):
-            jewelry_items.append(f"hands/wrists: {hands['text']}")
-        elif method == "image_reference":
-            hands_ref = image_mapping.get("jewelry_hands", "the hand/wrist jewelry reference image")
-            jewelry_items.append(f"hands/wrists: extract ONLY the jewelry from {hands_ref}, ignore any person/background/other elements, apply to hands and wrists")
-        elif method == "text_and_image" and hands.get("text"):
-            hands_ref = image_mapping.get("jewelry_hands", "the hand/wrist jewelry reference image")
-            jewelry_items.append(f"hands/wrists: {hands['text']} (extract jewelry from {hands_ref}, ignore person/background)")
+            ref = image_mapping.get(mapping_key, default_ref)
+            add_item(f"{label}: extract ONLY the jewelry from {ref}, ignore any person/background/other elements, apply to {apply_to}")
+        elif method == "text_and_image" and text:
+            ref = image_mapping.get(mapping_key, default_ref)
+            add_item(f"{label}: {text} (extract jewelry from {ref}, ignore person/background)")
     
     if jewelry_items:
-        parts.append(f"Jewelry and accessories: {', '.join(jewelry_items)}.")
+        parts.append(_FMT_JEWELRY % ", ".join(jewelry_items))
     
     return parts
 
 
-def build_environment_prompt(environment: Dict[str, Any], image_mapping: Dict[str, str] = None) -> List[str]:
+def build_environment_prompt(environment: Environment, image_mapping: Dict[str, str] = None) -> List[str]:
     """Build prompt parts for environment/background"""
     parts = []
-    image_mapping = image_mapping or {}
+    image_mapping = image_mapping or _EMPTY_MAPPING
     
     # Category
-    category = environment.get("category", "studio")
+    category = environment.category
     category_descriptions = {
         "studio": "professional studio setting",
         "indoor_lifestyle": "indoor lifestyle environment",
         "outdoor_urban": "outdoor urban environment",
         "outdoor_nature": "outdoor natural environment"
     }
-    parts.append(f"Environment: {category_descriptions.get(category, category)}.")
+    parts.append(_FMT_ENVIRONMENT % category_descriptions.get(category, category))
     
     # Method-specific description
-    method = environment.get("method", "auto")
-    if method == "text_description" and environment.get("text_description"):
-        parts.append(f"Background details: {environment['text_description']}.")
-    elif method == "reference_image" and environment.get("image_url"):
-        env_ref = image_mapping.get("environment", "the background/environment reference image")
-        parts.append(f"CRITICAL: Extract ONLY the background/environment/scene from {env_ref}. IGNORE any person, model, face, body, clothing, or foreground elements. Use ONLY the background, environment setting, and scene from {env_ref}.")
+    method = environment.method
+    text_description = environment.text_description
+    if method == "text_description" and text_description:
+        parts.append(_FMT_BACKGROUND_DETAILS % text_description)
+    elif method == "reference_image" and environment.image_url:
+        environment_label = image_mapping.get("environment")
+        if environment_label is not None:
+            parts.append(_TMPL_ENVIRONMENT.format(ref=environment_label))
+        else:
+            parts.append(_ENVIRONMENT_DEFAULT)
     
     return parts
 
 
-def build_photography_prompt(photography: Dict[str, Any], image_mapping: Dict[str, str] = None) -> List[str]:
+# Photography attributes in prompt order; ids in _UNDERSCORE_KEYS are shown with spaces
+_PHOTO_KEYS = ("aesthetic", "framing", "lighting")
+_UNDERSCORE_KEYS = frozenset({"framing", "lighting"})
+_UNDERSCORE_TO_SPACE = str.maketrans("_", " ")
+
+
+def build_photography_prompt(photography: Photography, image_mapping: Dict[str, str] = None) -> List[str]:
     """Build prompt parts for photography settings"""
     parts = []
-    image_mapping = image_mapping or {}
+    image_mapping = image_mapping or _EMPTY_MAPPING
     
     # Main photography settings
     photo_settings = []
-    
-    if photography.get("aesthetic"):
-        photo_settings.append(f"aesthetic: {photography['aesthetic']}")
-    
-    if photography.get("framing"):
-        framing_desc = photography['framing'].replace("_", " ")
-        photo_settings.append(f"framing: {framing_desc}")
-    
-    if photography.get("lighting"):
-        lighting_desc = photography['lighting'].replace("_", " ")
-        photo_settings.append(f"lighting: {lighting_desc}")
+    for key in _PHOTO_KEYS:
+        value = getattr(photography, key)
+        if value:
+            if key in _UNDERSCORE_KEYS:
+                value = value.translate(_UNDERSCORE_TO_SPACE)
+            photo_settings.append(f"{key}: {value}")
     
     if photo_settings:
-        parts.append(f"Photography style: {', '.join(photo_settings)}.")
+        parts.append(_FMT_PHOTOGRAPHY % ", ".join(photo_settings))
     
     # Shadows
-    shadows = photography.get("shadows", "").strip()
+    shadows = photography.shadows.strip()
     if shadows and shadows != "None - No specific shadow requirements":
         # If it's a dropdown option, clean it up
         if shadows.startswith("None - "):
             shadow_desc = shadows.replace("None - ", "")
         else:
             shadow_desc = shadows
-        parts.append(f"Shadows: {shadow_desc}.")
+        parts.append(_FMT_SHADOWS % shadow_desc)
     
     # Pose
-    pose = photography.get("pose", {})
-    pose_method = pose.get("method", "auto")
-    
-    if pose_method == "text_description" and pose.get("text"):
-        parts.append(f"Pose: {pose['text']}.")
-    elif pose_method == "reference_image" and pose.get("image_url"):
-        strength = pose.get("strength", 0.8)
+    pose = photography.pose
+    pose_method = pose.method
+    pose_text = pose.text
+    
+    if pose_method == "text_description" and pose_text:
+        parts.append(_FMT_POSE % pose_text)
+    elif pose_method == "reference_image" and pose.image_url:
+        strength = pose.strength
         pose_ref = image_mapping.get("pose", "the pose reference image")
-        parts.append(f"CRITICAL: Extract ONLY the body pose, positioning, and stance from {pose_ref}. IGNORE the face, clothing, outfit, background, and other elements. Use ONLY the body positioning and pose from {pose_ref} with {int(strength * 100)}% similarity.")
+        parts.append(_TMPL_POSE.format(ref=pose_ref, similarity=int(strength * 100)))
     
     # Hair
-    hair = photography.get("hair", {})
-    hair_method = hair.get("method", "auto")
-    
-    if hair_method == "text_description" and hair.get("text"):
-        parts.append(f"Hair styling: {hair['text']}.")
-    elif hair_method == "reference_image" and hair.get("image_url"):
-        hair_ref = image_mapping.get("hair", "the hairstyle reference image")
-        parts.append(f"CRITICAL: Extract ONLY the hairstyle, hair texture, and hair styling from {hair_ref}. IGNORE the face features, body, clothing, background, and other elements. Use ONLY the hairstyle and hair appearance from {hair_ref}.")
+    hair = photography.hair
+    hair_method = hair.method
+    hair_text = hair.text
+    
+    if hair_method == "text_description" and hair_text:
+        parts.append(_FMT_HAIR % hair_text)
+    elif hair_method == "reference_image" and hair.image_url:
+        hair_label = image_mapping.get("hair")
+        if hair_label is not None:
+            parts.append(_TMPL_HAIR.format(ref=hair_label))
+        else:
+            parts.append(_HAIR_DEFAULT)
     elif hair_method == "keep_original":
         parts.append("Keep the original hairstyle from the reference.")
     
@@ -220,191 +302,180 @@ def build_photography_prompt(photography: Dict[str, Any], image_mapping: Dict[st
 
 def build_quality_boost() -> str:
     """Return quality enhancement prompt"""
-    return (
-        "realistic head to body ratio, ultra-detailed, highly realistic, "
-        "professional photography, 8k uhd, cinematic lighting, soft natural light, "
-        "sharp focus, perfect skin texture, lifelike eyes, accurate facial proportions, "
-        "volumetric depth, subtle shadows, realistic skin tones, detailed hair strands, "
-        "fine pores, depth of field, masterpiece, award-winning portrait style"
-    )
+    return _QUALITY_BOOST
+
+
+# Config sections as (key, converter to the schemas type, builder), in prompt order
+_SECTIONS = (
+    ("model_reference", ModelRef.from_dict, build_model_reference_prompt),
+    ("base_outfit", Outfit.from_dict, build_outfit_prompt),
+    ("additional_items", items_from_list, build_additional_items_prompt),  # layered clothing
+    ("jewelry", Jewelry.from_dict, build_jewelry_prompt),
+    ("environment", Environment.from_dict, build_environment_prompt),
+    ("photography", Photography.from_dict, build_photography_prompt)
+)
+
+# Top-level config sections build_photoshoot_prompt reads (besides output.count)
+_PROMPT_SECTIONS = tuple(key for key, _, _ in _SECTIONS)
 
 
 def build_photoshoot_prompt(config: Dict[str, Any], image_mapping: Dict[str, str] = None) -> str:
     """Build comprehensive prompt from the new structured JSON config
     
+    The section text is memoized on a canonical digest of the config sections the
+    prompt reads (so a fresh meta.job_id doesn't defeat the cache) plus image_mapping.
+    Re-submitting the same configuration skips the section builders.
+    
     Args:
         config: Configuration dictionary
         image_mapping: Dictionary mapping image labels to descriptions (from prepare_image_parts)
     """
-    parts = []
-    image_mapping = image_mapping or {}
-    
-    # Check if batch generation (multiple outputs)
-    output_count = config.get("output", {}).get("count", 1)
-    if output_count > 1:
-        parts.append("CRITICAL CONSISTENCY REQUIREMENT: When generating multiple images, the model's face, body figure, outfit, all clothing items, jewelry, and accessories must remain EXACTLY THE SAME across all generated images. Only camera angles, poses, lighting variations, and composition can differ between images. All core elements must be identical.")
-    
-    # Model reference
-    if config.get("model_reference"):
-        parts.extend(build_model_reference_prompt(config["model_reference"], image_mapping))
-    
-    # Base outfit
-    if config.get("base_outfit"):
-        parts.extend(build_outfit_prompt(config["base_outfit"], image_mapping))
-    
-    # Additional items (layered clothing)
-    if config.get("additional_items"):
-        parts.extend(build_additional_items_prompt(config["additional_items"], image_mapping))
+    return _assemble_prompt(config, _prompt_body(config, image_mapping))
+
+
+def build_photoshoot_prompt_sections(config: Dict[str, Any], image_mapping: Dict[str, str] = None) -> Tuple[str, str]:
+    """Build the prompt split into fixed instructions and a per-request body
     
-    # Jewelry
-    if config.get("jewelry"):
-        parts.extend(build_jewelry_prompt(config["jewelry"], image_mapping))
+    The instructions (the batch consistency requirement when count > 1, and the
+    quality boost) never depend on the user's inputs, so they are byte-identical
+    across requests. Sent ahead of the body (e.g. as Gemini's systemInstruction)
+    they form a shared prefix the provider's prompt cache can match. The body
+    holds everything built from the config sections and image labels.
     
-    # Environment
-    if config.get("environment"):
-        parts.extend(build_environment_prompt(config["environment"], image_mapping))
+    Args:
+        config: Configuration dictionary
+        image_mapping: Dictionary mapping image labels to descriptions (from prepare_image_parts)
     
-    # Photography settings
-    if config.get("photography"):
-        parts.extend(build_photography_prompt(config["photography"], image_mapping))
+    Returns:
+        Tuple of (instructions, body)
+    """
+    instructions = " ".join(chain(_batch_consistency_parts(config), (_QUALITY_BOOST,)))
+    return instructions, _prompt_body(config, image_mapping)
+
+
+def config_digest(config: Dict[str, Any], image_mapping: Dict[str, str] = None) -> bytes:
+    """Serialize config and image_mapping to a canonical, reversible cache key
     
-    # Quality boost
-    parts.append(build_quality_boost())
+    Dict keys are sorted at every level, so equal configs give equal digests
+    whatever order their keys were set in. Packed with msgpack when installed,
+    otherwise as JSON.
     
-    return " ".join(parts)
+    Raises:
+        TypeError: If a value can't be serialized (or dict keys can't be sorted)
+    """
+    return _pack_key([_canonical(config), _canonical(image_mapping or {})])
+
+
+def _canonical(value: Any) -> Any:
+    """Copy of value with dict keys sorted at every level"""
+    if isinstance(value, dict):
+        return {key: _canonical(value[key]) for key in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(item) for item in value]
+    return value
+
+
+def _prompt_body(config: Dict[str, Any], image_mapping: Dict[str, str] = None) -> str:
+    """Section text of the prompt, memoized on the sections it reads plus image_mapping"""
+    prompt_config = {key: config[key] for key in _PROMPT_SECTIONS if key in config}
+    try:
+        digest = config_digest(prompt_config, image_mapping)
+    except (TypeError, ValueError, OverflowError):
+        # Not serializable, so it can't be used as a cache key
+        return _join_sections(config, image_mapping)
+    return _prompt_body_cached(digest)
+
+
+@lru_cache(maxsize=256)
+def _prompt_body_cached(digest: bytes) -> str:
+    """Build the section text from its config_digest cache key"""
+    config, image_mapping = _unpack_key(digest)
+    return _join_sections(config, image_mapping)
+
+
+def _join_sections(config: Dict[str, Any], image_mapping: Dict[str, str] = None) -> str:
+    """Uncached section text"""
+    # Each section's parts are joined straight from the builders' lists. str.join
+    # sizes the result up front and copies once, so it stays ahead of StringIO or
+    # += for these 1-3 KB prompts.
+    return " ".join(_section_parts(config, image_mapping or _EMPTY_MAPPING))
+
+
+def _assemble_prompt(config: Dict[str, Any], body: str) -> str:
+    """Wrap the section text in the batch consistency requirement and quality boost"""
+    return " ".join(chain(_batch_consistency_parts(config), (body,) if body else (), (_QUALITY_BOOST,)))
+
+
+def _build_photoshoot_prompt(config: Dict[str, Any], image_mapping: Dict[str, str] = None) -> str:
+    """Uncached implementation of build_photoshoot_prompt"""
+    return _assemble_prompt(config, _join_sections(config, image_mapping))
+
+
+def _batch_consistency_parts(config: Dict[str, Any]) -> Tuple[str, ...]:
+    """Consistency requirement for batch generation (multiple outputs)"""
+    output_count = config.get("output", {}).get("count", 1)
+    return (_BATCH_CONSISTENCY,) if output_count > 1 else ()
+
+
+def _section_parts(config: Dict[str, Any], image_mapping: Dict[str, str]) -> Iterable[str]:
+    """Convert each present config section to its schemas type and chain its prompt parts, in prompt order"""
+    return chain.from_iterable(
+        build(convert(config[key]), image_mapping)
+        for key, convert, build in _SECTIONS
+        if config.get(key)
+    )
 
 
 # Legacy support - handle old config format
 def build_photoshoot_prompt_legacy(config: Dict[str, Any]) -> str:
     """Build prompt from old config structure (for backward compatibility)"""
-    parts = []
-    
-    # CRITICAL: Clothing preservation instructions
-    if config.get("subject", {}).get("clothing_lock"):
-        clothing_lock = config["subject"]["clothing_lock"]
-        clothing_instruction = "CRITICAL REQUIREMENT: You must preserve the exact clothing from the primary reference image. "
-        
-        if clothing_lock.get("validation_description"):
-            clothing_instruction += f"The clothing consists of: {clothing_lock['validation_description']}. "
-        
-        if clothing_lock.get("garments_to_preserve") and len(clothing_lock["garments_to_preserve"]) > 0:
-            garments = ", ".join(clothing_lock["garments_to_preserve"])
-            clothing_instruction += f"Specifically preserve these garments: {garments}. "
-        
-        preservation_level = clothing_lock.get("preservation_level", "strict")
-        if preservation_level == "strict":
-            clothing_instruction += "Maintain exact texture, wrinkles, and details. "
-        elif preservation_level == "relaxed":
-            clothing_instruction += "Preserve the clothing design but allow natural lighting integration. "
-        
-        parts.append(clothing_instruction)
-    
-    # Model identity
-    if config.get("subject", {}).get("model_identity"):
-        model_identity = config["subject"]["model_identity"]
-        method = model_identity.get("method")
-        
-        if method == "keep_reference_face":
-            parts.append("Keep the model's face from the primary reference image exactly as shown.")
-        elif method == "generate_new" and model_identity.get("new_model_description"):
-            desc = model_identity["new_model_description"]
-            desc_parts = []
-            if desc.get("ethnicity"):
-                desc_parts.append(f"ethnicity: {desc['ethnicity']}")
-            if desc.get("hair_color"):
-                desc_parts.append(f"hair color: {desc['hair_color']}")
-            if desc.get("age_vibe"):
-                desc_parts.append(f"age: {desc['age_vibe']}")
-            if desc_parts:
-                parts.append(f"Generate a new model with the following characteristics: {', '.join(desc_parts)}.")
-    
-    # Pose
-    if config.get("subject", {}).get("pose"):
-        pose = config["subject"]["pose"]
-        pose_method = pose.get("method")
-        
-        if pose_method == "text_description" and pose.get("text_prompt"):
-            parts.append(f"Pose: {pose['text_prompt']}.")
-        elif pose_method == "reference_image":
-            strength = pose.get("mimicry_strength", 0.8)
-            parts.append(f"Use the pose from the reference image with {int(strength * 100)}% similarity.")
-    
-    # Styling - Hair
-    if config.get("subject", {}).get("styling", {}).get("hair"):
-        hair = config["subject"]["styling"]["hair"]
-        hair_method = hair.get("method")
-        
-        if hair_method == "text_description" and hair.get("text_prompt"):
-            parts.append(f"Hair styling: {hair['text_prompt']}.")
-        elif hair_method == "reference_image":
-            parts.append("Use the hairstyle from the reference image.")
-        elif hair_method == "none":
-            parts.append("No hair styling changes needed.")
-    
-    # Styling - Jewelry and Accessories
-    if config.get("subject", {}).get("styling", {}).get("jewelry_and_accessories"):
-        jewelry = config["subject"]["styling"]["jewelry_and_accessories"]
-        jewelry_parts = []
-        
-        if jewelry.get("neck"):
-            neck = jewelry["neck"]
-            if neck.get("method") == "text_description" and neck.get("text_prompt"):
-                jewelry_parts.append(f"neck: {neck['text_prompt']}")
-            elif neck.get("method") == "reference_image":
-                jewelry_parts.append("neck: use reference image")
-            elif neck.get("method") == "none":
-                jewelry_parts.append("neck: remove all jewelry")
-        
-        if jewelry.get("ears"):
-            ears = jewelry["ears"]
-            if ears.get("method") == "text_description" and ears.get("text_prompt"):
-                jewelry_parts.append(f"ears: {ears['text_prompt']}")
-            elif ears.get("method") == "reference_image":
-                jewelry_parts.append("ears: use reference image")
-            elif ears.get("method") == "none":
-                jewelry_parts.append("ears: remove all jewelry")
-        
-        if jewelry.get("hands_wrists"):
-            hands = jewelry["hands_wrists"]
-            if hands.get("method") == "text_description" and hands.get("text_prompt"):
-                jewelry_parts.append(f"hands/wrists: {hands['text_prompt']}")
-            elif hands.get("method") == "reference_image" and hands.get("use_auxiliary_ref"):
-                jewelry_parts.append("hands/wrists: use reference image")
-            elif hands.get("method") == "none":
-                jewelry_parts.append("hands/wrists: remove all accessories")
-        
-        if jewelry_parts:
-            parts.append(f"Jewelry and accessories: {', '.join(jewelry_parts)}.")
-    
-    # Environment
-    if config.get("environment"):
-        env = config["environment"]
-        if env.get("category"):
-            parts.append(f"Environment category: {env['category']}.")
-        
-        if env.get("details"):
-            details = env["details"]
-            if details.get("method") == "text_description" and details.get("text_prompt"):
-                parts.append(f"Background: {details['text_prompt']}.")
-            elif details.get("method") == "reference_image" and details.get("use_auxiliary_ref"):
-                parts.append("Use the background from the reference image.")
-    
-    # Photography direction
-    if config.get("photography_direction"):
-        photo = config["photography_direction"]
-        photo_parts = []
-        
-        if photo.get("aesthetic_preset"):
-            photo_parts.append(f"aesthetic: {photo['aesthetic_preset']}")
-        if photo.get("framing"):
-            photo_parts.append(f"framing: {photo['framing']}")
-        if photo.get("lighting_mood"):
-            photo_parts.append(f"lighting: {photo['lighting_mood']}")
-        
-        if photo_parts:
-            parts.append(f"Photography style: {', '.join(photo_parts)}.")
-    
-    # Quality boost
-    parts.append(build_quality_boost())
-    
-    return " ".join(parts)
+    # Imported on first use, so the legacy tables only load for old configs
+    from prompt_builder_legacy import build_photoshoot_prompt_legacy as _impl
+    return _impl(config)
+
+
+if __name__ == "__main__":
+    # Perf regression check: python prompt_builder.py
+    # Times the uncached builder, so the prompt cache can't hide a slowdown, on a
+    # config with every section set. The bound is generous (well over 10x the
+    # expected cost) so only real regressions, not machine noise, fail it.
+    import timeit
+    
+    reference_config = {
+        "meta": {"job_id": "perf", "platform_preset": "instagram_portrait"},
+        "model_reference": {"image_url": "https://example.com/model.jpg", "face_action": "keep"},
+        "base_outfit": {"image_url": "https://example.com/outfit.jpg", "text_description": "linen summer dress"},
+        "additional_items": [
+            {"type": "handbag", "image_url": "https://example.com/bag.jpg"},
+            {"type": "shoes", "text": "white leather sneakers"}
+        ],
+        "jewelry": {
+            "neck": {"enabled": True, "method": "text", "text": "thin gold chain"},
+            "ears": {"enabled": True, "method": "text", "text": "pearl studs"}
+        },
+        "environment": {"category": "outdoor", "method": "image", "image_url": "https://example.com/bg.jpg"},
+        "photography": {
+            "aesthetic": "editorial",
+            "framing": "full_body",
+            "lighting": "golden_hour",
+            "shadows": "soft",
+            "pose": {"method": "image", "image_url": "https://example.com/pose.jpg", "strength": 0.8},
+            "hair": {"method": "text", "text": "loose beach waves"}
+        },
+        "output": {"count": 4}
+    }
+    reference_mapping = {
+        "model_ref": "Image 1",
+        "outfit": "Image 2",
+        "item_0": "Image 3",
+        "environment": "Image 4",
+        "pose": "Image 5"
+    }
+    bound_us = 500
+    runs = 2000
+    
+    per_call_us = timeit.timeit(
+        lambda: _build_photoshoot_prompt(reference_config, reference_mapping), number=runs
+    ) / runs * 1e6
+    print(f"_build_photoshoot_prompt: {per_call_us:.1f} us/call (bound {bound_us} us)")
+    sys.exit(0 if per_call_us <= bound_us else 1)
@@ -0,0 +1,151 @@
+"""
+Prompt builder for the old config format (subject / environment /
+photography_direction), kept for backward compatibility.
+
+prompt_builder.build_photoshoot_prompt_legacy imports this module on first
+use, so apps on the current config format never load it.
+"""
+import sys
+from typing import Dict, Any
+
+from prompt_builder import _FMT_HAIR, _FMT_JEWELRY, _FMT_NEW_MODEL, _FMT_PHOTOGRAPHY, _FMT_POSE, _QUALITY_BOOST
+
+# %-format strings for single-substitution legacy prompt lines
+_FMT_LEGACY_CLOTHING = sys.intern("The clothing consists of: %s. ")
+_FMT_LEGACY_GARMENTS = sys.intern("Specifically preserve these garments: %s. ")
+_FMT_LEGACY_POSE_SIMILARITY = sys.intern("Use the pose from the reference image with %d%% similarity.")
+_FMT_LEGACY_USE_REFERENCE = sys.intern("%s: use reference image")
+_FMT_LEGACY_ENVIRONMENT = sys.intern("Environment category: %s.")
+_FMT_LEGACY_BACKGROUND = sys.intern("Background: %s.")
+
+# Legacy photography_direction keys and their prompt labels
+_LEGACY_PHOTO_KEYS = (
+    ("aesthetic_preset", "aesthetic"),
+    ("framing", "framing"),
+    ("lighting_mood", "lighting")
+)
+
+# Legacy new_model_description fields and their prompt labels
+_DESC_FIELDS = (
+    ("ethnicity", "ethnicity"),
+    ("hair_color", "hair color"),
+    ("age_vibe", "age")
+)
+
+# Legacy jewelry slots as (config key, prompt label, reference needs use_auxiliary_ref, text for method "none")
+_LEGACY_JEWELRY_SLOTS = (
+    ("neck", "neck", False, "remove all jewelry"),
+    ("ears", "ears", False, "remove all jewelry"),
+    ("hands_wrists", "hands/wrists", True, "remove all accessories")
+)
+
+
+def build_photoshoot_prompt_legacy(config: Dict[str, Any]) -> str:
+    """Build prompt from old config structure (for backward compatibility)"""
+    parts = []
+    
+    # CRITICAL: Clothing preservation instructions
+    if config.get("subject", {}).get("clothing_lock"):
+        clothing_lock = config["subject"]["clothing_lock"]
+        clothing_instruction = "CRITICAL REQUIREMENT: You must preserve the exact clothing from the primary reference image. "
+        
+        if clothing_lock.get("validation_description"):
+            clothing_instruction += _FMT_LEGACY_CLOTHING % clothing_lock['validation_description']
+        
+        if clothing_lock.get("garments_to_preserve") and len(clothing_lock["garments_to_preserve"]) > 0:
+            garments = ", ".join(clothing_lock["garments_to_preserve"])
+            clothing_instruction += _FMT_LEGACY_GARMENTS % garments
+        
+        preservation_level = clothing_lock.get("preservation_level", "strict")
+        if preservation_level == "strict":
+            clothing_instruction += "Maintain exact texture, wrinkles, and details. "
+        elif preservation_level == "relaxed":
+            clothing_instruction += "Preserve the clothing design but allow natural lighting integration. "
+        
+        parts.append(clothing_instruction)
+    
+    # Model identity
+    if config.get("subject", {}).get("model_identity"):
+        model_identity = config["subject"]["model_identity"]
+        method = model_identity.get("method")
+        
+        if method == "keep_reference_face":
+            parts.append("Keep the model's face from the primary reference image exactly as shown.")
+        elif method == "generate_new" and model_identity.get("new_model_description"):
+            desc = model_identity["new_model_description"]
+            desc_parts = [f"{label}: {desc[key]}" for key, label in _DESC_FIELDS if desc.get(key)]
+            if desc_parts:
+                parts.append(_FMT_NEW_MODEL % ", ".join(desc_parts))
+    
+    # Pose
+    if config.get("subject", {}).get("pose"):
+        pose = config["subject"]["pose"]
+        pose_method = pose.get("method")
+        
+        if pose_method == "text_description" and pose.get("text_prompt"):
+            parts.append(_FMT_POSE % pose['text_prompt'])
+        elif pose_method == "reference_image":
+            strength = pose.get("mimicry_strength", 0.8)
+            parts.append(_FMT_LEGACY_POSE_SIMILARITY % int(strength * 100))
+    
+    # Styling - Hair
+    if config.get("subject", {}).get("styling", {}).get("hair"):
+        hair = config["subject"]["styling"]["hair"]
+        hair_method = hair.get("method")
+        
+        if hair_method == "text_description" and hair.get("text_prompt"):
+            parts.append(_FMT_HAIR % hair['text_prompt'])
+        elif hair_method == "reference_image":
+            parts.append("Use the hairstyle from the reference image.")
+        elif hair_method == "none":
+            parts.append("No hair styling changes needed.")
+    
+    # Styling - Jewelry and Accessories
+    if config.get("subject", {}).get("styling", {}).get("jewelry_and_accessories"):
+        jewelry = config["subject"]["styling"]["jewelry_and_accessories"]
+        jewelry_parts = []
+        
+        for key, label, needs_aux_ref, none_text in _LEGACY_JEWELRY_SLOTS:
+            slot = jewelry.get(key)
+            if not slot:
+                continue
+            method = slot.get("method")
+            if method == "text_description" and slot.get("text_prompt"):
+                jewelry_parts.append(f"{label}: {slot['text_prompt']}")
+            elif method == "reference_image" and (not needs_aux_ref or slot.get("use_auxiliary_ref")):
+                jewelry_parts.append(_FMT_LEGACY_USE_REFERENCE % label)
+            elif method == "none":
+                jewelry_parts.append(f"{label}: {none_text}")
+        
+        if jewelry_parts:
+            parts.append(_FMT_JEWELRY % ", ".join(jewelry_parts))
+    
+    # Environment
+    if config.get("environment"):
+        env = config["environment"]
+        if env.get("category"):
+            parts.append(_FMT_LEGACY_ENVIRONMENT % env['category'])
+        
+        if env.get("details"):
+            details = env["details"]
+            if details.get("method") == "text_description" and details.get("text_prompt"):
+                parts.append(_FMT_LEGACY_BACKGROUND % details['text_prompt'])
+            elif details.get("method") == "reference_image" and details.get("use_auxiliary_ref"):
+                parts.append("Use the background from the reference image.")
+    
+    # Photography direction
+    if config.get("photography_direction"):
+        photo = config["photography_direction"]
+        photo_parts = [
+            f"{label}: {photo[key]}"
+            for key, label in _LEGACY_PHOTO_KEYS
+            if photo.get(key)
+        ]
+        
+        if photo_parts:
+            parts.append(_FMT_PHOTOGRAPHY % ", ".join(photo_parts))
+    
+    # Quality boost
+    parts.append(_QUALITY_BOOST)
+    
+    return " ".join(parts)
@@ -0,0 +1,172 @@
+"""
+Typed, read-only views of the config sections prompt_builder reads.
+
+Each from_dict applies the same defaults the prompt builders used with
+dict.get, so a section converted once gives the builders plain attribute
+access (slot offsets rather than hash lookups) without changing any prompt.
+"""
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Any, List, Mapping, Optional, Tuple
+
+# Stand-in for missing nested sections
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
+
+@dataclass(slots=True, frozen=True)
+class ModelRef:
+    """config["model_reference"]"""
+    text_description: Optional[str] = None
+    image_url: Optional[str] = None
+    face_action: str = "keep"
+    new_model_description: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "ModelRef":
+        return cls(
+            text_description=data.get("text_description"),
+            image_url=data.get("image_url"),
+            face_action=data.get("face_action", "keep"),
+            new_model_description=data.get("new_model_description")
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class Outfit:
+    """config["base_outfit"]"""
+    text_description: Optional[str] = None
+    image_url: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Outfit":
+        return cls(
+            text_description=data.get("text_description"),
+            image_url=data.get("image_url")
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class Item:
+    """One entry of config["additional_items"]"""
+    type: str = "item"
+    text: Optional[str] = None
+    image_url: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Item":
+        return cls(
+            type=data.get("type", "item"),
+            text=data.get("text"),
+            image_url=data.get("image_url")
+        )
+
+
+def items_from_list(items: List[Mapping[str, Any]]) -> Tuple[Item, ...]:
+    """Convert config["additional_items"], keeping list order (item_{idx} labels depend on it)"""
+    return tuple(Item.from_dict(item) for item in items)
+
+
+@dataclass(slots=True, frozen=True)
+class JewelrySlot:
+    """One slot (neck, ears, hands_wrists) of config["jewelry"]"""
+    enabled: bool = False
+    method: str = "none"
+    text: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "JewelrySlot":
+        return cls(
+            enabled=data.get("enabled"),
+            method=data.get("method", "none"),
+            text=data.get("text")
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class Jewelry:
+    """config["jewelry"]"""
+    neck: JewelrySlot = JewelrySlot()
+    ears: JewelrySlot = JewelrySlot()
+    hands_wrists: JewelrySlot = JewelrySlot()
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Jewelry":
+        return cls(
+            neck=JewelrySlot.from_dict(data.get("neck") or _EMPTY),
+            ears=JewelrySlot.from_dict(data.get("ears") or _EMPTY),
+            hands_wrists=JewelrySlot.from_dict(data.get("hands_wrists") or _EMPTY)
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class Environment:
+    """config["environment"]"""
+    category: str = "studio"
+    method: str = "auto"
+    text_description: Optional[str] = None
+    image_url: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Environment":
+        return cls(
+            category=data.get("category", "studio"),
+            method=data.get("method", "auto"),
+            text_description=data.get("text_description"),
+            image_url=data.get("image_url")
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class Pose:
+    """config["photography"]["pose"]"""
+    method: str = "auto"
+    text: Optional[str] = None
+    image_url: Optional[str] = None
+    strength: float = 0.8
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Pose":
+        return cls(
+            method=data.get("method", "auto"),
+            text=data.get("text"),
+            image_url=data.get("image_url"),
+            strength=data.get("strength", 0.8)
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class Hair:
+    """config["photography"]["hair"]"""
+    method: str = "auto"
+    text: Optional[str] = None
+    image_url: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Hair":
+        return cls(
+            method=data.get("method", "auto"),
+            text=data.get("text"),
+            image_url=data.get("image_url")
+        )
+
+
+@dataclass(slots=True, frozen=True)
+class Photography:
+    """config["photography"]"""
+    aesthetic: Optional[str] = None
+    framing: Optional[str] = None
+    lighting: Optional[str] = None
+    shadows: str = ""
+    pose: Pose = Pose()
+    hair: Hair = Hair()
+
+    @classmethod
+    def from_dict(cls, data: Mapping[str, Any]) -> "Photography":
+        return cls(
+            aesthetic=data.get("aesthetic"),
+            framing=data.get("framing"),
+            lighting=data.get("lighting"),
+            shadows=data.get("shadows", ""),
+            pose=Pose.from_dict(data.get("pose") or _EMPTY),
+            hair=Hair.from_dict(data.get("hair") or _EMPTY)
+        )